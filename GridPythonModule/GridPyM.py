@@ -30,12 +30,764 @@
 
 
 # Required imports:
-from sympy.combinatorics import Permutation
-from random import randrange
-from matplotlib import pyplot as plt
+from random import randrange, shuffle, Random
+#(an underscore, so that "from GridPythonModule import *" does not hide the random module)
+from random import random as _random_float
+from collections import namedtuple
+from time import perf_counter
+from bisect import bisect_left, bisect_right, insort
+from heapq import heappush, heappop
+from math import exp as _exp
+from array import array as _array
+import struct as _struct
+import sys as _sys
+#matplotlib, numpy and concurrent.futures are only needed by a few functions,
+#and they are imported there: this keeps "import GridPythonModule" fast
+
+#the names exported by "from GridPythonModule import *". The helpers imported above
+#are not exported, except randrange which was exported before this list existed
+__all__ = ['Grid', 'GridCorpusReader', 'GridCorpusWriter', 'GridState', 'Move',
+           'SimplifyStats', 'apply_move', 'ascending_cusps', 'available_knots',
+           'available_legendrian_knots', 'batch_ascending_cusps',
+           'batch_descending_cusps', 'batch_invariants', 'batch_number_of_components',
+           'batch_rotation_number', 'batch_thurston_bennequin', 'batch_writhe',
+           'canonical_grid', 'check_grid', 'coherent_bs', 'commutation_sites',
+           'commute_columns', 'commute_rows', 'connected_sum', 'convert_to_Sage',
+           'convert_to_braid', 'crossing_number', 'cyclic_shift', 'descending_cusps',
+           'destabilization_sites', 'destabilize', 'destabilize_all', 'disjoint_union',
+           'draw_grid', 'enumerate_grids', 'fill_random_grids', 'Gauss_code',
+           'generate_random_grid', 'generate_torus_link', 'generate_twist_knot',
+           'generate_unknot', 'generate_unlink', 'grid_hash', 'grid_length',
+           'grid_number', 'identify_knot', 'invert_orientation', 'iter_grids',
+           'iter_moves', 'iter_random_grids', 'load_knot', 'load_legendrian_knot',
+           'mirror_grid', 'number_of_components', 'parallel_copies',
+           'perform_all_moves', 'reduce_braid', 'rotate', 'rotate_once',
+           'rotation_number', 'scramble_grid', 'self_linking', 'simplify_grid',
+           'stabilisation', 'thurston_bennequin', 'uncoherent_bs', 'undo_move',
+           'write_corpus', 'writhe',
+           'randrange']
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+#the symmetries of the square used by "canonical_grid", as pairs (transform, swap)
+#where transform is in the format of _apply_symmetry and swap exchanges X and O
+_SYMMETRY_GROUPS = {
+    'translations': [((False,False,False), False)],
+    'isotopy': [((False,False,False), False), ((False,True,True), False),
+                ((True,False,False), True), ((True,True,True), True)],
+    'dihedral': [((s,r,c), False) for s in (False,True) for r in (False,True) for c in (False,True)]}
+
+#the catalogs of "load_knot" (minimal grids) and "load_legendrian_knot" (from the 
+#Legendrian knot atlas, see the link there), both indexed by "identify_knot"
+_KNOTS = {'3_1': [[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]], '4_1': [[5, 0, 3, 4, 2, 1], [2, 4, 5, 1, 0, 3]], '5_1':[[4,5, 6, 0, 1, 2, 3], [6, 2, 3, 4, 5, 0, 1]], '5_2': [[1, 5, 6, 2, 3, 4, 0], [6, 0, 4, 5, 1, 2, 3]],'6_1': [[7, 0, 5, 6, 3, 4, 2, 1], [2, 6, 7, 4, 5, 1, 0, 3]], '6_2': [[7, 2, 4, 5, 6, 1, 0, 3], [5,6, 7, 0, 3, 4, 2, 1]], '6_3': [[7, 0, 3, 5, 6, 4, 2, 1], [3, 4, 6, 7, 2, 1, 0, 5]], '7_1': [[1, 6,7, 8, 0, 2, 3, 4, 5], [8, 0, 1, 4, 5, 6, 7, 2, 3]], '7_2': [[1, 7, 8, 5, 6, 2, 3, 4, 0], [8, 0, 6,7,4, 5, 1, 2, 3]], '7_3': [[3, 0, 8, 7, 6, 5, 2, 1, 4], [8, 7, 6, 5, 4, 1, 0, 3, 2]], '7_4': [[5, 0,8, 2, 1, 7, 4, 3, 6], [8, 7, 1, 0, 6, 3, 2, 5, 4]], '7_5': [[2, 7, 8, 0, 3, 4, 5, 6, 1], [8, 0, 1,6,7, 2, 3, 4, 5]], '7_6': [[1, 7, 8, 3, 2, 4, 5, 6, 0], [8, 0, 2, 1, 6, 7, 3, 4, 5]], '7_7': [[1, 4,7, 8, 6, 3, 2, 5, 0], [8, 0, 2, 5, 1, 7, 4, 3, 6]], '8_1': [[9, 5, 6, 3, 4, 1, 2, 8, 7, 0], [6, 7,4,5, 2, 3, 0, 1, 9, 8]], '8_2': [[9, 0, 8, 1, 7, 2, 3, 4, 5, 6], [1, 7, 2, 3, 9, 4, 5, 6, 8, 0]],'8_3': [[4, 7, 6, 9, 8, 2, 3, 0, 1, 5], [6, 5, 8, 7, 3, 4, 1, 2, 9, 0]], '8_4': [[1, 0, 3, 2, 8,9,4, 5, 6, 7], [9, 2, 1, 4, 3, 5, 6, 7, 8, 0]], '8_5': [[5, 0, 10, 9, 7, 8, 4, 3, 2, 1, 6],[10, 9,8,3, 2, 6, 7, 1, 5, 4, 0]], '8_6': [[9, 3, 2, 0, 7, 8, 1, 4, 5, 6], [2, 1, 8, 3, 9, 4, 5, 6, 7, 0]],'8_7': [[9, 0, 6, 7, 8, 5, 4, 3, 2, 1], [5, 7, 8, 9, 4, 3, 2, 1, 0, 6]], '8_8': [[9, 0, 3, 7, 2,1,5, 4, 8, 6], [1, 7, 8, 9, 4, 3, 2, 6, 5, 0]], '8_9': [[1, 0, 8, 9, 4, 3, 2, 5, 6, 7], [9, 4, 3, 5,2, 1, 6, 7, 8, 0]], '8_10': [[8, 2, 5, 6, 7, 4, 3, 1, 0, 10, 9], [3, 6, 7, 8, 10, 9, 5, 4, 2, 1, 0]],'8_11': [[9, 0, 8, 4, 7, 3, 5, 1, 2, 6], [4, 7, 5, 6, 9, 8, 2, 3, 0, 1]], '8_12': [[2, 3, 0, 1, 5,6, 9, 8, 4, 7], [8, 1, 2, 6, 7, 4, 5, 3, 9, 0]], '8_13': [[9, 0, 5, 7, 8, 4, 2, 3, 1, 6], [4, 7, 8,9, 3, 1, 0, 6, 5, 2]], '8_14': [[9, 2, 8, 3, 7, 4, 0, 1, 5,6], [3, 7, 4, 5, 9, 1, 2, 6, 8, 0]], '8_15': [[10, 1, 6, 8, 7, 2, 3, 4, 5, 9, 0],  [2, 8, 9, 10, 3,6,0, 7, 1, 4, 5]], '8_16': [[2, 1, 7, 8, 3, 5, 4, 9, 0, 10, 6],  [9, 5, 10, 6, 7, 8, 2, 3, 4, 1, 0]],'8_17': [[6, 8, 9, 2, 3, 5, 4, 1, 0, 7], [9, 1, 3, 4, 7, 8, 0, 6, 5, 2]], '8_18': [[2, 1, 3, 4, 0,6, 7, 9, 8, 5], [9, 7, 8, 2, 3, 1, 5, 6, 4, 0]], '8_19': [[2, 1, 0, 6, 5, 4, 3], [6, 5, 4, 3, 2, 1,0]], '8_20': [[7, 1, 0, 3, 4, 6, 5, 2], [3, 6, 4, 5, 7, 2, 1, 0]], '8_21': [[7, 0, 3, 5, 4, 6, 1, 2],[4, 6, 7, 1, 0, 2, 3, 5]] }
+
+_LEGENDRIAN_KNOTS = {'3_1': [[[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]]], 'm(3_1)': [[[4, 3, 2, 1, 0], [1, 0, 4, 3, 2]]], '4_1': [[[5, 0, 3, 4, 2, 1], [2, 4, 5, 1, 0, 3]]], '5_1': [[[4, 5, 6, 0, 1, 2, 3], [6, 2, 3, 4, 5, 0, 1]], [[1, 2, 3, 4, 5, 6, 0], [6, 0, 1, 2, 3, 4, 5]]], 'm(5_1)': [[[1, 0, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 1, 0]]], '5_2': [[[1, 5, 6, 2, 3, 4, 0], [6, 0, 4, 5, 1, 2, 3]]], 'm(5_2)': [[[3, 0, 6, 5, 2, 1, 4], [6, 5, 4, 1, 0, 3, 2]], [[3, 1, 6, 5, 0, 4, 2], [6, 5, 4, 2, 3, 1, 0]]], '6_1': [[[7, 0, 5, 6, 3, 4, 2, 1], [2, 6, 7, 4, 5, 1, 0, 3]]], 'm(6_1)': [[[7, 0, 5, 6, 2, 1, 4, 3], [4, 6, 7, 1, 0, 3, 2, 5]], [[7, 2, 5, 6, 4, 1, 0, 3], [4, 6, 7, 3, 0, 5, 2, 1]]], '6_2': [[[7, 2, 4, 5, 6, 1, 0, 3], [5, 6, 7, 0, 3, 4, 2, 1]], [[7, 0, 6, 4, 1, 2, 3, 5], [1, 4, 2, 7, 3, 5, 6, 0]], [[7, 6, 4, 5, 0, 1, 2, 3], [5, 0, 7, 1, 2, 3, 4, 6]]], 'm(6_2)': [[[7, 6, 5, 4, 1, 0, 2, 3], [2, 0, 7, 6, 5, 3, 4, 1]]], '6_3': [[[7, 0, 3, 5, 6, 4, 2, 1], [3, 4, 6, 7, 2, 1, 0, 5]], [[7, 6, 5, 3, 4, 0, 1, 2], [5, 4, 0, 7, 1, 2, 3, 6]]], '7_1': [[[1, 6, 7, 8, 0, 2, 3, 4, 5], [8, 0, 1, 4, 5, 6, 7, 2, 3]], [[6, 7, 8, 0, 1, 2, 3, 4, 5], [8, 4, 5, 6, 7, 0, 1, 2, 3]], [[1, 2, 3, 4, 5, 6, 7, 8, 0], [8, 0, 1, 2, 3, 4, 5, 6, 7]]], 'm(7_1)': [[[1, 0, 8, 7, 6, 5, 4, 3, 2], [8, 7, 6, 5, 4, 3, 2, 1, 0]]], '7_2': [[[1, 7, 8, 5, 6, 2, 3, 4, 0], [8, 0, 6, 7, 4, 5, 1, 2, 3]]], 'm(7_2)': [[[5, 0, 8, 7, 2, 1, 4, 3, 6], [8, 7, 6, 1, 0, 3, 2, 5, 4]], [[5, 2, 8, 7, 0, 1, 6, 3, 4], [8, 7, 6, 4, 5, 3, 2, 0, 1]], [[5, 3, 8, 7, 0, 6, 2, 1, 4], [8, 7, 6, 4, 5, 1, 0, 3, 2]], [[5, 3, 8, 7, 1, 6, 0, 4, 2], [8, 7, 6, 4, 5, 2, 3, 1, 0]]], '7_3': [[[3, 0, 8, 7, 6, 5, 2, 1, 4], [8, 7, 6, 5, 4, 1, 0, 3, 2]], [[3, 1, 8, 7, 6, 5, 0, 4, 2], [8, 7, 6, 5, 4, 2, 3, 1, 0]]], 'm(7_3)': [[[4, 7, 8, 5, 6, 0, 1, 2, 3], [8, 2, 6, 7, 3, 4, 5, 0, 1]], [[1, 7, 8, 2, 3, 4, 5, 6, 0], [8, 0, 6, 7, 1, 2, 3, 4, 5]]], '7_4': [[[5, 0, 8, 2, 1, 7, 4, 3, 6], [8, 7, 1, 0, 6, 3, 2, 5, 4]], [[5, 2, 8, 0, 7, 4, 3, 1, 6], [8, 7, 3, 6, 1, 2, 0, 5, 4]], [[6, 3, 8, 0, 7, 5, 2, 1, 4], [8, 7, 5, 6, 4, 1, 0, 3, 2]], [[6, 3, 8, 1, 7, 5, 0, 4, 2], [8, 7, 5, 6, 4, 2, 3, 1, 0]]], 'm(7_4)': [[[1, 7, 8, 2, 5, 6, 3, 4, 0], [8, 0, 6, 7, 1, 4, 5, 2, 3]]], '7_5': [[[2, 7, 8, 0, 3, 4, 5, 6, 1], [8, 0, 1, 6, 7, 2, 3, 4, 5]], [[1, 7, 8, 2, 4, 3, 5, 6, 0], [8, 0, 4, 6, 7, 1, 2, 3, 5]], [[4, 7, 8, 3, 5, 6, 0, 1, 2], [8, 1, 6, 7, 2, 3, 4, 5, 0]], [[1, 6, 7, 8, 2, 3, 4, 5, 0], [8, 0, 5, 6, 7, 1, 2, 3, 4]]], 'm(7_5)': [[[3, 0, 8, 7, 6, 2, 1, 5, 4], [8, 7, 6, 5, 1, 0, 4, 3, 2]], [[4, 1, 8, 7, 6, 0, 5, 3, 2], [8, 7, 6, 5, 3, 4, 2, 1, 0]]], '7_6': [[[1, 7, 8, 3, 2, 4, 5, 6, 0], [8, 0, 2, 1, 6, 7, 3, 4, 5]], [[5, 7, 8, 0, 1, 3, 2, 6, 4], [8, 2, 6, 4, 7, 0, 5, 3, 1]], [[5, 7, 8, 4, 0, 6, 1, 2, 3], [8, 2, 6, 7, 5, 3, 4, 0, 1]]], 'm(7_6)': [[[2, 0, 8, 7, 5, 6, 4, 3, 1], [8, 7, 6, 1, 0, 3, 2, 5, 4]], [[3, 7, 8, 2, 1, 6, 5, 0, 4], [8, 0, 6, 7, 5, 4, 2, 3, 1]], [[3, 0, 8, 7, 5, 6, 2, 1, 4], [8, 7, 6, 1, 0, 4, 5, 3, 2]]], '7_7': [[[1, 4, 7, 8, 6, 3, 2, 5, 0], [8, 0, 2, 5, 1, 7, 4, 3, 6]], [[1, 5, 7, 8, 4, 3, 2, 6, 0], [8, 0, 2, 6, 7, 1, 5, 4, 3]], [[2, 0, 8, 4, 3, 6, 5, 7, 1], [8, 7, 1, 0, 5, 4, 2, 3, 6]]], 'm(7_7)': [[[3, 7, 8, 1, 0, 6, 4, 5, 2], [8, 0, 6, 7, 5, 2, 1, 3, 4]], [[3, 7, 8, 2, 5, 6, 1, 0, 4], [8, 1, 6, 7, 0, 4, 5, 3, 2]]]}
+
+#the knots in the catalog which are isotopic to their mirror image
+_AMPHICHIRAL_KNOTS = ['4_1', '6_3', '8_3', '8_9', '8_12', '8_17', '8_18']
+
+#the index of "identify_knot", built the first time it is needed
+_KNOT_INDEX = {}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class Grid(object):
+    r"""
+    A grid diagram which also stores the inverse permutations of its X and O markings,
+    so that the row containing the marking in a given column is found in constant time
+    (instead of calling "A.index" on the lists). A Grid behaves like the usual pair
+    [A, B] of lists, and can be given as input to every function of the module.
+    Functions performing moves on a Grid return a new Grid, whose inverse permutations
+    are again consistent with its markings. The lists stored in a Grid should not be
+    modified in place.
+
+    OUTPUT:
+
+    A Grid object.
+
+    Rotations of a Grid (and hence mirrors, see "rotate" and "mirror_grid") are lazy:
+    they return a view sharing the markings of the original Grid, together with a 
+    pending symmetry of the square. Consecutive rotations are composed symbolically, 
+    and the markings of the view are only computed (in linear time) the first time 
+    they are needed.
+
+    EXAMPLES::
+
+    >> G = Grid(load_knot('3_1'))
+    >> G
+    Grid([[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]])
+    >> G.X_inverse
+    [1, 2, 3, 4, 0]
+    >> writhe(G) == writhe(load_knot('3_1'))
+    True
+    >> cyclic_shift(G, 1, 0)
+    Grid([[3, 4, 0, 1, 2], [0, 1, 2, 3, 4]])
+    >> H = rotate(rotate(G, 3), 2)
+    >> H
+    Grid([[3, 2, 1, 0, 4], [0, 4, 3, 2, 1]])
+
+    """
+    __slots__ = ('_markings', '_inverses', '_transform')
+
+    def __init__(self, input_grid):
+        if isinstance(input_grid, Grid):
+            self._markings = input_grid._markings
+            self._inverses = input_grid._inverses
+            self._transform = input_grid._transform
+            return
+        if check_grid(input_grid) == 1:
+            raise Exception("Invalid Input")
+        A, B = input_grid
+        self._markings = (list(A), list(B))
+        self._inverses = (_inverse_permutation(A), _inverse_permutation(B))
+        self._transform = None
+
+    def _materialize(self):
+        #applies the pending symmetry, if any, to the markings and their inverses
+        if self._transform is not None:
+            A = _apply_symmetry(self._markings[0], self._inverses[0], self._transform)
+            B = _apply_symmetry(self._markings[1], self._inverses[1], self._transform)
+            self._markings = (A, B)
+            self._inverses = (_inverse_permutation(A), _inverse_permutation(B))
+            self._transform = None
+
+    def _view(self, transform):
+        #a Grid sharing the markings of self, with a further pending symmetry
+        out_grid = Grid(self)
+        if out_grid._transform is None:
+            out_grid._transform = transform
+        else:
+            out_grid._transform = _compose_symmetries(transform, out_grid._transform)
+        if out_grid._transform == (False, False, False):
+            out_grid._transform = None
+        return out_grid
+
+    @property
+    def X(self):
+        self._materialize()
+        return self._markings[0]
+
+    @property
+    def O(self):
+        self._materialize()
+        return self._markings[1]
+
+    @property
+    def X_inverse(self):
+        self._materialize()
+        return self._inverses[0]
+
+    @property
+    def O_inverse(self):
+        self._materialize()
+        return self._inverses[1]
+
+    def __getitem__(self, index):
+        self._materialize()
+        return self._markings[index]
+
+    def __iter__(self):
+        self._materialize()
+        return iter(self._markings)
+
+    def __len__(self):
+        return 2
+
+    def __eq__(self, other):
+        if isinstance(other, (Grid, list, tuple)) and len(other) == 2:
+            self._materialize()
+            return self._markings[0] == list(other[0]) and self._markings[1] == list(other[1])
+        return False
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __hash__(self):
+        self._materialize()
+        return hash((tuple(self._markings[0]), tuple(self._markings[1])))
+
+    def __repr__(self):
+        self._materialize()
+        return 'Grid(%s)' %[self._markings[0], self._markings[1]]
+
+    def copy(self):
+        return Grid(self)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+Move = namedtuple('Move', ['kind', 'index', 'subtype'])
+Move.__doc__ = r"""
+    A lightweight description of a Cromwell move, as produced by "iter_moves". The kind
+    is one of 'stabilisation', 'commutation' and 'destabilization'; the index is the row
+    (or column) where the move is performed, and the subtype is respectively the kind of
+    stabilisation ('XNE', 'XNW', ...), 'rows' or 'columns', and 'row' or 'col'.
+    Non-interleaving commutations only are described, as in "perform_all_moves". The
+    kind 'shift' describes the cyclic shift with horizontal and vertical shifts given
+    by the index and the subtype, as recorded by "GridState".
+
+    OUTPUT:
+
+    A Move named tuple.
+
+    EXAMPLES::
+
+    >> M = Move('stabilisation', 2, 'XNW')
+    >> apply_move(generate_torus_link(4,3), M)
+    [[0, 1, 2, 3, 4, 5, 6, 7], [5, 6, 3, 7, 0, 1, 2, 4]]
+
+    """
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class GridState(object):
+    r"""
+    A mutable grid, meant for search algorithms which perform and take back many moves.
+    The markings and their inverse permutations are stored in arrays of C integers, and
+    the moves modify them in place: commutations take constant time, while cyclic
+    shifts and (de)stabilisations take linear time. Every successful move is recorded
+    as a "Move" in the list "history" (cyclic shifts as Move('shift', horizontal, 
+    vertical)), so that it can be given again to "apply_move"; "undo" restores the 
+    previous grid without storing copies of it. The methods are named as the functions 
+    of the module and follow the same conventions, except that commutations are only 
+    non-interleaving (as in "Move") and that they return 1 instead of the new grid, or 
+    0 if the move cannot be performed. Shifts are taken modulo the grid number. Unlike
+    "destabilize", which returns the unchanged grid on the rows of a 2x2 component,
+    "GridState.destabilize" returns 0 there, so a successful destabilization always 
+    makes the grid smaller.
+
+    OUTPUT:
+
+    A GridState object.
+
+    EXAMPLES::
+
+    >> S = GridState(load_knot('3_1'))
+    >> S.stabilisation(2, 'XSE')
+    1
+    >> S.commute_columns(0)
+    1
+    >> S.grid()
+    [[5, 1, 0, 2, 3, 4], [2, 3, 4, 0, 5, 1]]
+    >> S.history
+    [Move(kind='stabilisation', index=2, subtype='XSE'), Move(kind='commutation', index=0, subtype='columns')]
+    >> S.undo(2)
+    >> S.grid()
+    [[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]]
+
+    """
+    __slots__ = ('A', 'B', 'Ainv', 'Binv', 'history', '_undo')
+
+    def __init__(self, input_grid):
+        if check_grid(input_grid) == 1:
+            raise Exception("Invalid Input")
+        Ainv, Binv = _inverses(input_grid)
+        self.A = _array('i', input_grid[0])
+        self.B = _array('i', input_grid[1])
+        self.Ainv = _array('i', Ainv)
+        self.Binv = _array('i', Binv)
+        self.history = []
+        #what is needed to take back each move of history, besides the move itself
+        self._undo = []
+
+    def __len__(self):
+        return len(self.A)
+
+    def __repr__(self):
+        return 'GridState(%s)' %self.grid()
+
+    def grid(self):
+        #a copy of the current grid, as a pair of lists
+        return [self.A.tolist(), self.B.tolist()]
+
+    def _record(self, move, data = None):
+        self.history.append(move)
+        self._undo.append(data)
+        return 1
+
+    def _rebuild(self, selection):
+        #recomputes the permutations of one kind from the others, after a
+        #(de)stabilisation performed on the rows or on the columns
+        if selection == 'row':
+            self.Ainv = _array('i', _inverse_permutation(self.A))
+            self.Binv = _array('i', _inverse_permutation(self.B))
+        else:
+            self.A = _array('i', _inverse_permutation(self.Ainv))
+            self.B = _array('i', _inverse_permutation(self.Binv))
+
+    def _commute(self, where, subtype):
+        #swaps the rows (or columns) where and where+1, if they are not interleaved
+        if subtype == 'rows':
+            P, Q, Pinv, Qinv = self.A, self.B, self.Ainv, self.Binv
+        else:
+            P, Q, Pinv, Qinv = self.Ainv, self.Binv, self.A, self.B
+        if where < 0 or where > len(P) - 2:
+            raise Exception("Invalid parameters")
+        if _commutation_codes(P[where:where+2], Q[where:where+2]) != 'N':
+            return 0
+        P[where], P[where+1] = P[where+1], P[where]
+        Q[where], Q[where+1] = Q[where+1], Q[where]
+        Pinv[P[where]], Pinv[P[where+1]] = where, where+1
+        Qinv[Q[where]], Qinv[Q[where+1]] = where, where+1
+        return 1
+
+    def _shift(self, horizontal, vertical):
+        n = len(self.A)
+        self.A = self.A[vertical:] + self.A[:vertical]
+        self.B = self.B[vertical:] + self.B[:vertical]
+        self.Ainv = self.Ainv[horizontal:] + self.Ainv[:horizontal]
+        self.Binv = self.Binv[horizontal:] + self.Binv[:horizontal]
+        for P in (self.A, self.B):
+            for i in range(n):
+                P[i] = (P[i] - horizontal) % n
+        for P in (self.Ainv, self.Binv):
+            for i in range(n):
+                P[i] = (P[i] - vertical) % n
+
+    def commute_rows(self, where):
+        if self._commute(where, 'rows') == 0:
+            return 0
+        return self._record(Move('commutation', where, 'rows'))
+
+    def commute_columns(self, where):
+        if self._commute(where, 'columns') == 0:
+            return 0
+        return self._record(Move('commutation', where, 'columns'))
+
+    def cyclic_shift(self, horizontal = 1, vertical = 1):
+        n = len(self.A)
+        horizontal %= n
+        vertical %= n
+        self._shift(horizontal, vertical)
+        return self._record(Move('shift', horizontal, vertical))
+
+    def stabilisation(self, row = 3, kind = 'XNE'):
+        n = len(self.A)
+        if kind not in ['XNE','XNW','XSE','XSW','ONE','ONW','OSE','OSW'] or 0 > row or row > n-1:
+            raise Exception("Invalid kind of stabilisation!")
+        #the stabilisation inserts a row next to the given one (where), and a column 
+        #next to the marking p of the selected kind (column), and moves that marking to 
+        #the new column; see the destabilization below
+        which = 0 if kind[0] == 'X' else 1
+        p = (self.A, self.B)[which][row]
+        where, marking, column = {'NW': (row, p, p+1), 'NE': (row, p+1, p),
+                                  'SW': (row+1, p, p+1), 'SE': (row+1, p+1, p)}[kind[1:]]
+        neighbour = row + 1 if where == row else row
+        markings = [marking, column] if which == 0 else [column, marking]
+        value = _insert_grid_row((self.A, self.B), where, markings, column, neighbour, which)
+        self._rebuild('row')
+        return self._record(Move('stabilisation', row, kind), (where, column, neighbour, which, value))
+
+    def destabilize(self, where, selection = 'row'):
+        if selection in ['row', 'rows']:
+            selection = 'row'
+            P, Q = self.A, self.B
+        elif selection in ['col', 'column', 'columns']:
+            selection = 'col'
+            P, Q = self.Ainv, self.Binv
+        else:
+            raise Exception("Invalid parameters")
+        n = len(P)
+        if where < 0 or where > n-1:
+            raise Exception("The index must be between 0 and grid number")
+        a, b = P[where], Q[where]
+        if n == 2 or (a - b != 1 and b - a != 1):
+            return 0
+        #the marking of row where sharing its column with a marking of the neighbouring
+        #row is removed together with its column, and the neighbouring marking takes the
+        #column of the other marking of the row. A 2x2 component cannot be removed
+        for neighbour in [where+1, where-1]:
+            if 0 <= neighbour < n and (Q[neighbour] == a or P[neighbour] == b):
+                if Q[neighbour] == a and P[neighbour] == b:
+                    return 0
+                if Q[neighbour] == a:
+                    which, column, value = 1, a, b
+                else:
+                    which, column, value = 0, b, a
+                break
+        else:
+            return 0
+        markings = _remove_grid_row((P, Q), where, column, neighbour, which, value)
+        self._rebuild(selection)
+        return self._record(Move('destabilization', where, selection), (where, markings, column, neighbour, which))
+
+    def apply(self, move):
+        #performs a Move, as described in "iter_moves", or a shift recorded in history
+        kind, where, subtype = move
+        if kind == 'stabilisation':
+            return self.stabilisation(where, subtype)
+        if kind == 'commutation' and subtype == 'rows':
+            return self.commute_rows(where)
+        if kind == 'commutation' and subtype == 'columns':
+            return self.commute_columns(where)
+        if kind == 'destabilization':
+            return self.destabilize(where, subtype)
+        if kind == 'shift':
+            return self.cyclic_shift(where, subtype)
+        raise Exception("Invalid move")
+
+    def undo(self, steps = 1):
+        #takes back the last "steps" moves
+        if steps < 0 or steps > len(self.history):
+            raise Exception("There are not enough moves to undo")
+        for i in range(steps):
+            kind, where, subtype = self.history.pop()
+            data = self._undo.pop()
+            if kind == 'commutation':
+                self._commute(where, subtype)
+            elif kind == 'shift':
+                n = len(self.A)
+                self._shift((n - where) % n, (n - subtype) % n)
+            elif kind == 'stabilisation':
+                _remove_grid_row((self.A, self.B), *data)
+                self._rebuild('row')
+            else:
+                lists = (self.A, self.B) if subtype == 'row' else (self.Ainv, self.Binv)
+                _insert_grid_row(lists, *data)
+                self._rebuild(subtype)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class SimplifyStats(object):
+    r"""
+    The statistics of a run of "simplify_grid": the seed of the run (None when the global
+    random generator is used), the strategy, the grid number and the length of the final
+    grid, the number of moves tried and accepted (for the 'random' strategy, the moves
+    which could be performed), the time in seconds, the size trajectory as a list of 
+    pairs (moves tried, grid number) recorded whenever the grid shrinks, and the reason
+    why the run stopped: 'effort', 'size' (the grid cannot be made smaller), 'time', 
+    'target', 'patience' or 'exhausted' (the beam search has no new grids to try). For compatibility, the statistics can also be read as a
+    dictionary, e.g. stats['grid_number'].
+
+    OUTPUT:
+
+    A SimplifyStats object.
+
+    EXAMPLES::
+
+    >> H, stats = simplify_grid(generate_unknot(30), return_stats = True)
+    >> stats[0]
+    SimplifyStats(seed=None, strategy='random', grid_number=2, grid_length=4, moves=1, accepted=0, time=0.0004274, stopped='size')
+    >> stats[0].sizes
+    [(0, 30), (0, 2)]
+
+    """
+    __slots__ = ('seed', 'strategy', 'grid_number', 'grid_length', 'moves', 'accepted', 'time', 'sizes', 'stopped',
+                 '_start', '_deadline', '_target', '_patience')
+
+    def __init__(self, seed = None, strategy = 'random', time_limit = None, target_size = None, patience = None):
+        self.seed = seed
+        self.strategy = strategy
+        self.grid_number = None
+        self.grid_length = None
+        self.moves = 0
+        self.accepted = 0
+        self.time = 0.0
+        self.sizes = []
+        self.stopped = None
+        self._start = perf_counter()
+        self._deadline = None if time_limit is None else self._start + time_limit
+        self._target = target_size
+        self._patience = patience
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def __repr__(self):
+        return ('SimplifyStats(seed=%r, strategy=%r, grid_number=%r, grid_length=%r, moves=%r, accepted=%r, time=%.4g, stopped=%r)'
+                %(self.seed, self.strategy, self.grid_number, self.grid_length, self.moves, self.accepted, self.time, self.stopped))
+
+    def _record(self, n):
+        #adds a point to the trajectory, if the grid number changed
+        if not self.sizes or self.sizes[-1][1] != n:
+            self.sizes.append((self.moves, n))
+
+    def _stop(self, n):
+        #checks the stopping conditions other than the effort, before each move
+        if self._target is not None and n <= self._target:
+            self.stopped = 'target'
+        elif self._patience is not None and self.moves - self.sizes[-1][0] >= self._patience:
+            self.stopped = 'patience'
+        elif self._deadline is not None and perf_counter() > self._deadline:
+            self.stopped = 'time'
+        return self.stopped is not None
+
+    def _progress(self, tries):
+        #the fraction of the effort (or of the time) used so far
+        progress = self.moves/tries
+        if self._deadline is not None:
+            progress = max(progress, (perf_counter() - self._start)/(self._deadline - self._start))
+        return min(progress, 1.0)
+
+    def _finish(self, A, B):
+        self.grid_number = len(A)
+        self.grid_length = grid_length([A,B])
+        self.time = perf_counter() - self._start
+        if self.stopped is None:
+            self.stopped = 'size' if len(A) <= 3 else 'effort'
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+#the binary corpus format of "GridCorpusWriter" and "GridCorpusReader". The header is
+#the magic string, the version, the width in bytes of the markings, two padding bytes,
+#four reserved bytes, the number of grids and the offsets (in bytes) of the markings 
+#and of the index. The markings of the i-th grid, A followed by B, are the values in 
+#positions index[i] to index[i+1] (the index has count+1 unsigned 64-bit entries).
+#Everything is little-endian
+_CORPUS_MAGIC = b'GRIDPYM\x00'
+_CORPUS_HEADER = '<8sBBHIQQQ'
+_CORPUS_WIDTHS = {1: ('B', '<u1'), 2: ('H', '<u2'), 4: ('I', '<u4')}
+
+class GridCorpusWriter(object):
+    r"""
+    Writes grids to a binary corpus file, which is much smaller and faster to read than
+    the JSON format, and can be read without loading it into memory with a 
+    "GridCorpusReader". Each marking takes 1, 2 or 4 bytes, according to the maximal 
+    grid number of the corpus (up to 256, 65536 or 2**32); grids of different sizes can 
+    be stored in the same corpus. The grids are written as they are given, and the 
+    index of their positions is written when the writer is closed (it can also be used
+    in a "with" statement).
+
+    OUTPUT:
+
+    A GridCorpusWriter object.
+
+    EXAMPLES::
+
+    >> with GridCorpusWriter('knots.grids', max_grid_number = 11) as writer:
+    ..     for name in ['3_1', '5_2', '8_5']:
+    ..         writer.write(load_knot(name))
+    >> GridCorpusReader('knots.grids')[1]
+    [[1, 5, 6, 2, 3, 4, 0], [6, 0, 4, 5, 1, 2, 3]]
+
+    """
+    __slots__ = ('path', 'max_grid_number', 'width', '_file', '_typecode', '_offsets')
+
+    def __init__(self, path, max_grid_number):
+        if type(max_grid_number) != type(1) or max_grid_number < 2 or max_grid_number > 2**32:
+            raise Exception("Invalid maximal grid number")
+        self.path = path
+        self.max_grid_number = max_grid_number
+        self.width = 1 if max_grid_number <= 2**8 else 2 if max_grid_number <= 2**16 else 4
+        self._typecode = _CORPUS_WIDTHS[self.width][0]
+        self._offsets = _array('Q', [0])
+        self._file = open(path, 'wb')
+        self._file.write(bytes(_struct.calcsize(_CORPUS_HEADER)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def write(self, input_grid):
+        if check_grid(input_grid) == 1:
+            raise Exception("Invalid Input")
+        n = len(input_grid[0])
+        if n > self.max_grid_number:
+            raise Exception("The grid is larger than the maximal grid number of the corpus")
+        markings = _array(self._typecode, input_grid[0])
+        markings.extend(input_grid[1])
+        if _sys.byteorder == 'big':
+            markings.byteswap()
+        self._file.write(markings.tobytes())
+        self._offsets.append(self._offsets[-1] + 2*n)
+
+    def close(self):
+        #writes the index (aligned to 8 bytes) and the header
+        if self._file.closed:
+            return
+        data_offset = _struct.calcsize(_CORPUS_HEADER)
+        index_offset = data_offset + self._offsets[-1]*self.width
+        index_offset += -index_offset % 8
+        self._file.write(bytes(index_offset - data_offset - self._offsets[-1]*self.width))
+        offsets = _array('Q', self._offsets)
+        if _sys.byteorder == 'big':
+            offsets.byteswap()
+        self._file.write(offsets.tobytes())
+        self._file.seek(0)
+        self._file.write(_struct.pack(_CORPUS_HEADER, _CORPUS_MAGIC, 1, self.width, 0, 0, len(self), data_offset, index_offset))
+        self._file.close()
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class GridCorpusReader(object):
+    r"""
+    Reads a binary corpus written by "GridCorpusWriter" or "write_corpus". The file is
+    memory-mapped, so that opening it takes constant time and memory, whatever the 
+    number of grids: reader[i] reads the i-th grid only, as a pair of lists. The 
+    method "arrays" returns instead two NumPy arrays sharing the memory of the file 
+    (without copies), and "as_array" all the markings of a corpus of grids of the same
+    size as a single array of shape (count, 2, n). The reader can only be closed once
+    these arrays have been deleted, since they would otherwise point to unmapped memory.
+
+    OUTPUT:
+
+    A GridCorpusReader object.
+
+    EXAMPLES::
+
+    >> write_corpus('random.grids', iter_random_grids(20, count = 1000))
+    1000
+    >> corpus = GridCorpusReader('random.grids')
+    >> len(corpus), corpus.grid_number(7), corpus[7] == list(iter_random_grids(20, 8))[7]
+    (1000, 20, True)
+    >> batch_invariants(corpus.as_array())['writhe'][:3]
+    array([ 2, -2, -1])
+
+    """
+    __slots__ = ('path', 'width', '_file', '_map', '_data', '_index', '_count', '_typecode', '_dtype', '_data_offset',
+                 '_index_offset')
+
+    def __init__(self, path):
+        import mmap
+        self.path = path
+        self._file = open(path, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+            header = _struct.unpack_from(_CORPUS_HEADER, self._map, 0)
+        except (ValueError, _struct.error):
+            self._file.close()
+            raise Exception("Invalid corpus file")
+        magic, version, width, padding, reserved, count, data_offset, index_offset = header
+        if magic != _CORPUS_MAGIC or version != 1 or width not in _CORPUS_WIDTHS:
+            self.close()
+            raise Exception("Invalid corpus file")
+        self.width = width
+        self._count = count
+        self._typecode, self._dtype = _CORPUS_WIDTHS[width]
+        self._data_offset = data_offset
+        self._index_offset = index_offset
+        self._views()
+
+    def _views(self):
+        #the markings and the index, as views of the mapped file
+        self._data = memoryview(self._map)[self._data_offset:self._index_offset]
+        self._index = memoryview(self._map)[self._index_offset:self._index_offset + 8*(self._count+1)].cast('Q')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, i):
+        start, end = self._bounds(i)
+        markings = self._data[start*self.width:end*self.width].cast(self._typecode).tolist()
+        if _sys.byteorder == 'big':
+            markings = _array(self._typecode, markings)
+            markings.byteswap()
+            markings = markings.tolist()
+        n = (end - start)//2
+        return [markings[:n], markings[n:]]
+
+    def __iter__(self):
+        for i in range(self._count):
+            yield self[i]
+
+    def _bounds(self, i):
+        #the positions of the markings of the i-th grid
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("Grid index out of range")
+        start, end = self._index[i], self._index[i+1]
+        if _sys.byteorder == 'big':
+            start, end = [int.from_bytes(value.to_bytes(8, 'big'), 'little') for value in (start, end)]
+        return start, end
+
+    def grid_number(self, i):
+        start, end = self._bounds(i)
+        return (end - start)//2
+
+    def arrays(self, i):
+        #the markings of the i-th grid as two NumPy arrays, sharing the memory of the file
+        import numpy as np
+        start, end = self._bounds(i)
+        markings = np.frombuffer(self._map, dtype = self._dtype, count = end - start, 
+                                 offset = self._data_offset + start*self.width)
+        n = (end - start)//2
+        return markings[:n], markings[n:]
+
+    def as_array(self):
+        #all the markings as a single NumPy array of shape (count, 2, n), sharing the
+        #memory of the file; the grids must all have the same size
+        import numpy as np
+        if self._count == 0:
+            raise Exception("The corpus is empty")
+        n = self.grid_number(0)
+        if self._index[self._count] != 2*n*self._count:
+            raise Exception("The grids of the corpus have different sizes")
+        markings = np.frombuffer(self._map, dtype = self._dtype, count = 2*n*self._count, offset = self._data_offset)
+        return markings.reshape(self._count, 2, n)
+
+    def close(self):
+        #the arrays returned by "arrays" and "as_array" must be deleted first: if they
+        #still exist, the reader is left open
+        if hasattr(self, '_data'):
+            self._index.release()
+            self._data.release()
+        if hasattr(self, '_map') and not self._map.closed:
+            try:
+                self._map.close()
+            except BufferError:
+                self._views()
+                raise Exception("The arrays of the corpus must be deleted before closing it")
+        self._file.close()
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def apply_move(input_grid, move, in_place = False):
+    r"""
+    Performs the Cromwell move described by "move" (see "Move" and "iter_moves") on the 
+    input grid. If "in_place" is True, the input grid must be a "GridState", which is 
+    modified instead of building a new grid (see "GridState.apply"). In this case the 
+    returned record is the move added to the history of the GridState, and it can be
+    given to "undo_move" to restore the grid as it was before the move.
+    
+    OUTPUT:
+
+    The grid obtained after the move (or a record for "undo_move" if "in_place" is 
+    True), or 0 if the move cannot be performed.
+
+    EXAMPLES::
+    
+    >> G = apply_move([[0,1,2,3,4],[2,3,4,0,1]], Move('stabilisation', 0, 'ONE'))
+    >> G
+    [[2, 0, 1, 3, 4, 5], [3, 2, 4, 5, 0, 1]]
+    >> S = GridState(G)
+    >> record = apply_move(S, Move('commutation', 1, 'columns'), in_place = True)
+    >> S.grid()
+    [[1, 0, 2, 3, 4, 5], [3, 1, 4, 5, 0, 2]]
+    >> undo_move(S, record)
+    >> S.grid()
+    [[2, 0, 1, 3, 4, 5], [3, 2, 4, 5, 0, 1]]
+    
+    """
+    kind, where, subtype = move
+    if not in_place:
+        if kind == 'stabilisation':
+            return stabilisation(input_grid, row = where, kind = subtype)
+        if kind == 'commutation' and subtype == 'rows':
+            return commute_rows(input_grid, where, interleaving = 'N')
+        if kind == 'commutation' and subtype == 'columns':
+            return commute_columns(input_grid, where, interleaving = 'N')
+        if kind == 'destabilization':
+            return destabilize(input_grid, where, selection = subtype)
+        if kind == 'shift':
+            return cyclic_shift(input_grid, where, subtype)
+        raise Exception("Invalid move")
+    if not isinstance(input_grid, GridState):
+        raise Exception("In-place moves need a GridState")
+    if input_grid.apply(move) == 0:
+        return 0
+    return input_grid.history[-1]
+
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 def ascending_cusps(input_grid):
@@ -161,6 +913,222 @@ def available_legendrian_knots(cr_number = True):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def batch_ascending_cusps(input_grids):
+    r"""
+    Same as "ascending_cusps", but computed at once for a batch of grids of the same
+    size. The input is a NumPy integer array of shape (k, 2, n) (or anything that can
+    be converted into one, like a list of grids), whose entry [i, 0] is the list of
+    the X markings of the i-th grid and [i, 1] the list of its O markings.
+
+    OUTPUT:
+
+    A NumPy array with the number of ascending cusps of each grid.
+
+    EXAMPLES::
+
+    >> batch_ascending_cusps([load_knot('3_1'), generate_unknot(5)])
+    array([2, 1])
+
+    """
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    return _batch_descending_cusps(B, A, Binv, Ainv)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_descending_cusps(input_grids):
+    r"""
+    Same as "descending_cusps", but computed at once for a (k, 2, n) array of grids
+    (see "batch_ascending_cusps" for the input format).
+
+    OUTPUT:
+
+    A NumPy array with the number of descending cusps of each grid.
+
+    EXAMPLES::
+
+    >> batch_descending_cusps([load_knot('3_1'), generate_unknot(5)])
+    array([4, 7])
+
+    """
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    return _batch_descending_cusps(A, B, Ainv, Binv)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_invariants(input_grids):
+    r"""
+    Computes the writhe, the Thurston-Bennequin number, the rotation number, the 
+    numbers of descending and ascending cusps and the number of components of a 
+    (k, 2, n) array of grids (see "batch_ascending_cusps" for the input format).
+    The values coincide with the ones given by the corresponding functions applied
+    to each grid, but they are computed with array operations on the whole batch.
+
+    OUTPUT:
+
+    A dictionary whose keys are the names of the invariants, and whose values are
+    NumPy arrays with one entry for each grid.
+
+    EXAMPLES::
+
+    >> G = [load_knot('3_1'), generate_torus_link(2,3), generate_unknot(5)]
+    >> batch_invariants(G)['writhe']
+    array([-3,  3,  0])
+    >> batch_invariants(G)['thurston_bennequin']
+    array([-6,  1, -4])
+
+    """
+    import numpy as np
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    writhes = _batch_writhe(A, B, Ainv, Binv)
+    descending = _batch_descending_cusps(A, B, Ainv, Binv)
+    ascending = _batch_descending_cusps(B, A, Binv, Ainv)
+    return {'writhe': writhes,
+            'thurston_bennequin': np.trunc(writhes - (descending + ascending)/2).astype(np.int64),
+            'rotation_number': np.trunc((descending - ascending)/2).astype(np.int64),
+            'descending_cusps': descending,
+            'ascending_cusps': ascending,
+            'number_of_components': _batch_number_of_components(B, Ainv)}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_number_of_components(input_grids):
+    r"""
+    Same as "number_of_components", but computed at once for a (k, 2, n) array of 
+    grids (see "batch_ascending_cusps" for the input format).
+
+    OUTPUT:
+
+    A NumPy array with the number of components of each grid.
+
+    EXAMPLES::
+
+    >> batch_number_of_components([generate_unlink(3), generate_torus_link(3,3)])
+    array([3, 3])
+
+    """
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    return _batch_number_of_components(B, Ainv)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_rotation_number(input_grids):
+    r"""
+    Same as "rotation_number", but computed at once for a (k, 2, n) array of grids
+    (see "batch_ascending_cusps" for the input format).
+
+    OUTPUT:
+
+    A NumPy array with the rotation number of each grid.
+
+    EXAMPLES::
+
+    >> batch_rotation_number([load_knot('3_1'), generate_unknot(5)])
+    array([1, 3])
+
+    """
+    import numpy as np
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    descending = _batch_descending_cusps(A, B, Ainv, Binv)
+    ascending = _batch_descending_cusps(B, A, Binv, Ainv)
+    return np.trunc((descending - ascending)/2).astype(np.int64)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_thurston_bennequin(input_grids):
+    r"""
+    Same as "thurston_bennequin", but computed at once for a (k, 2, n) array of grids
+    (see "batch_ascending_cusps" for the input format).
+
+    OUTPUT:
+
+    A NumPy array with the Thurston-Bennequin number of each grid.
+
+    EXAMPLES::
+
+    >> batch_thurston_bennequin([load_knot('3_1'), mirror_grid(load_knot('3_1'))])
+    array([-6,  1])
+
+    """
+    import numpy as np
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    descending = _batch_descending_cusps(A, B, Ainv, Binv)
+    ascending = _batch_descending_cusps(B, A, Binv, Ainv)
+    return np.trunc(_batch_writhe(A, B, Ainv, Binv) - (descending + ascending)/2).astype(np.int64)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def batch_writhe(input_grids):
+    r"""
+    Same as "writhe", but computed at once for a (k, 2, n) array of grids (see 
+    "batch_ascending_cusps" for the input format).
+
+    OUTPUT:
+
+    A NumPy array with the writhe of each grid.
+
+    EXAMPLES::
+
+    >> batch_writhe([load_knot('3_1'), mirror_grid(load_knot('3_1'))])
+    array([-3,  3])
+
+    """
+    A, B, Ainv, Binv = _batch_setup(input_grids)
+    return _batch_writhe(A, B, Ainv, Binv)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def canonical_grid(input_grid, symmetries = 'isotopy'):
+    r"""
+    Computes a canonical representative of the class of the input grid under the
+    torus translations (see "cyclic_shift") and a group of symmetries of the square.
+    Two grids have the same canonical form if and only if one can be obtained from
+    the other by these moves. The admissible values of "symmetries" are:
+    
+    - 'translations': only the n^2 torus translations;
+    - 'isotopy' (default): translations, the rotation by 180 degrees and the two
+      reflections along the diagonals combined with the exchange of X and O. These 
+      are the symmetries preserving the oriented link type;
+    - 'dihedral': translations and all the 8 symmetries of the square (see "rotate").
+      Note that this identifies a grid with its mirror image.
+    
+    Each row i is encoded by the pair ((A[i+1]-A[i]) mod n, (B[i]-A[i]) mod n), so 
+    that translations act by rotating this sequence; the least rotation is found in 
+    linear time with Booth's algorithm. The representative is the lexicographically
+    minimal encoding among the images of the grid, with A[0] = 0. 
+
+    OUTPUT:
+
+    The canonical grid.
+
+    EXAMPLES::
+    
+    >> G = load_knot('3_1')
+    >> canonical_grid(G)
+    [[0, 1, 2, 3, 4], [2, 3, 4, 0, 1]]
+    >> canonical_grid(cyclic_shift(rotate(G,2),3,1))
+    [[0, 1, 2, 3, 4], [2, 3, 4, 0, 1]]
+    >> canonical_grid(mirror_grid(G)) == canonical_grid(G)
+    False
+    >> canonical_grid(mirror_grid(G),'dihedral') == canonical_grid(G,'dihedral')
+    True
+
+    """
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input")
+    if symmetries not in _SYMMETRY_GROUPS:
+        raise Exception("Invalid symmetry group")
+    n = len(input_grid[0])
+    code = _canonical_encoding(input_grid, symmetries)
+    A = [0]
+    B = []
+    for i in range(n):
+        B.append((A[i] + code[i] % n) % n)
+        if i < n-1:
+            A.append((A[i] + code[i]//n) % n)
+    return _same_type(input_grid, [A,B])
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def check_grid(input_grid):
     r"""
     Checks if the given input represents a valid grid. 
@@ -182,10 +1150,11 @@ def check_grid(input_grid):
     if len(input_grid) != 2:
         return 1
     A,B = input_grid
-    if len(A) != len(B) or set(A) != set(B) or set(A) != set([i for i in range(len(A))]) or set(B) != set([i for i in range(len(A))]):
+    numbers = set(range(len(A)))
+    if len(A) != len(B) or set(A) != numbers or set(B) != numbers:
         return 1
-    for j in range(len(A)):
-        if A[j] == B[j]:
+    for a, b in zip(A, B):
+        if a == b:
             return 1
     return 0
 
@@ -224,13 +1193,40 @@ def coherent_bs(input_grid, where, which = 'rows'):
         remember = [A[where], A[where+1]]
         A[where] = remember[1]
         A[where+1] = remember[0]
-        return(A,B)
+        return(_same_type(input_grid, (A,B)))
     if which == 'columns' or which == 'c':
         AA,BB = rotate([A,B],1)
         remember = [AA[where], AA[where+1]]
         AA[where] = remember[1]
         AA[where+1] = remember[0]
-        return(rotate([AA,BB],3))
+        return(_same_type(input_grid, rotate([AA,BB],3)))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def commutation_sites(input_grid):
+    r"""
+    Classifies at once all the pairs of adjacent rows and of adjacent columns of the 
+    grid, according to the commutation they admit: 'N' if the markings are not 
+    interleaved (so that they can be commuted with interleaving = 'N'), 'Y' if they are
+    interleaved (a commutation changes the link type), and 'B' if the commutation is 
+    blocked because two markings lie in the same column (row). The i-th character 
+    refers to the pair i, i+1. This is a single O(n) pass, instead of calling 
+    "commute_rows" and "commute_columns" on every index.
+
+    OUTPUT:
+
+    A list [row_codes, column_codes] of two strings of length n-1.
+
+    EXAMPLES::
+    
+    >> commutation_sites([[2, 4, 0, 3, 5, 1], [5, 2, 3, 0, 1, 4]])
+    ['BYBYB', 'NNNNY']
+    
+    """
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input grid")
+    Ainv, Binv = _inverses(input_grid)
+    return [_commutation_codes(input_grid[0], input_grid[1]), _commutation_codes(Ainv, Binv)]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -260,17 +1256,17 @@ def commute_rows(input_grid, where, interleaving = 'N', verbose = False):
     if _check_rows(input_grid, where) == 5:
         return 0
     if interleaving == 'A':
-        return([A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]])
+        return(_same_type(input_grid, [A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]]))
     if interleaving == 'Y':
         if _check_rows(input_grid, where) == False:
-            return([A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]])
+            return(_same_type(input_grid, [A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]]))
         else:
             if verbose == True:
                 print("These are not interleaved!")
             return 0
     if interleaving == 'N':
         if _check_rows(input_grid, where) == True:
-            return([A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]])
+            return(_same_type(input_grid, [A[:where] + [A[where+1]] + [A[where]] + A[where+2:],B[:where] + [B[where+1]] + [B[where]] + B[where+2:]]))
         else:
             if verbose == True:
                 print("These rows/columns are interleaved!")
@@ -290,12 +1286,13 @@ def commute_columns(input_grid,where, interleaving = 'A', verbose = False):
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid Input")
-    A = input_grid[0]
-    B = input_grid[1]
-    if commute_rows(rotate([A,B],1),where, interleaving = interleaving, verbose = verbose) == 0:
+    #commuting two columns is the same as commuting two rows of the grid formed by
+    #the inverse permutations (i.e. the grid reflected along the diagonal)
+    commuted = commute_rows(list(_inverses(input_grid)),where, interleaving = interleaving, verbose = verbose)
+    if commuted == 0:
         return 0
-    AA,BB = commute_rows(rotate([A,B],1),where, interleaving = interleaving, verbose = verbose)
-    return(rotate([AA,BB],3))    
+    AA,BB = commuted
+    return(_same_type(input_grid, [_inverse_permutation(AA), _inverse_permutation(BB)]))
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -338,7 +1335,7 @@ def connected_sum(input_grid1,input_grid2):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def convert_to_braid(input_grid, optimized = 'Y', verbose = False):
+def convert_to_braid(input_grid, optimized = 'Y', verbose = False, reduce = False):
     r"""
     Return a braid word whose closure represents the same link as the input grid.  
     The "optimized" option can be either "Y", "N", "S". The first gives as output the 
@@ -346,6 +1343,8 @@ def convert_to_braid(input_grid, optimized = 'Y', verbose = False):
     the second just output the first braid obtained, while the last option first attempts
     to simplify the grid before producing the smallest braid. The verbose option controls
     whether additional output is printed for grids representing the trivial braid.
+    If "reduce" is True, the braid words are shortened with "reduce_braid" (which also 
+    prints their lengths before and after the reduction, if "verbose" is True).
     
     OUTPUT:
 
@@ -370,6 +1369,8 @@ def convert_to_braid(input_grid, optimized = 'Y', verbose = False):
     if optimized not in ['N','Y','S']:
         raise Exception("Invalid optimization input.")
     if optimized == 'N':
+        if reduce:
+            return reduce_braid(_aux_braid(input_grid), verbose = verbose)
         return _aux_braid(input_grid)
     elif optimized == 'Y':
         firstB = _aux_braid(input_grid)
@@ -378,6 +1379,9 @@ def convert_to_braid(input_grid, optimized = 'Y', verbose = False):
             if verbose:
                 print('Trivial braid representing the link with %s components'%number_of_components(input_grid))
             return [1]
+        if reduce:
+            firstB = reduce_braid(firstB, verbose = verbose)
+            secondB = reduce_braid(secondB, verbose = verbose)
         if len(firstB) > len(secondB):
             return secondB
         else:
@@ -390,6 +1394,9 @@ def convert_to_braid(input_grid, optimized = 'Y', verbose = False):
             if verbose:
                 print('Trivial braid representing the link with %s components'%number_of_components(input_grid))
             return [1]
+        if reduce:
+            firstB = reduce_braid(firstB, verbose = verbose)
+            secondB = reduce_braid(secondB, verbose = verbose)
         if len(firstB) > len(secondB):
             return secondB
         else:
@@ -444,14 +1451,7 @@ def crossing_number(input_grid):
     363
     
     """
-    A = input_grid[0]
-    B = input_grid[1]
-    crossings_aux = 0
-    for i in range(1,len(A)-1):
-        for j in range(min(A[i],B[i]),max(A[i],B[i])):
-            if min(A.index(j), B.index(j)) < i < max(A.index(j), B.index(j)):
-                crossings_aux += 1
-    return crossings_aux
+    return _crossings_sweep(input_grid)[0]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -478,14 +1478,14 @@ def cyclic_shift(input_grid, horizontal = 1, vertical = 1):
         raise Exception("Invalid Input")
     A = input_grid[0]
     B = input_grid[1]
+    n = len(A)
     if vertical != 0:
         A = A[vertical:]+A[:vertical]
         B = B[vertical:]+B[:vertical]
-    if horizontal != 0:
-        A = rotate_once(A)[horizontal:] + rotate_once(A)[:horizontal]
-        B = rotate_once(B)[horizontal:] + rotate_once(B)[:horizontal]
-        A,B = rotate([A,B],3)
-    return([A,B])
+    if horizontal != 0 and horizontal < n:
+        A = [(a - horizontal) % n for a in A]
+        B = [(b - horizontal) % n for b in B]
+    return(_same_type(input_grid, [A,B]))
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -511,57 +1511,192 @@ def descending_cusps(input_grid):
     Dcusps = 0
     A = input_grid[0]
     B = input_grid[1]
+    Ainv, Binv = _inverses(input_grid)
     for i in range(len(A)):
         if A[i] < B[i]:
-            if B.index(A[i]) < i :
+            if Binv[A[i]] < i :
                 Dcusps += 1
-            if A.index(B[i]) > i:
+            if Ainv[B[i]] > i:
                 Dcusps += 1
     return(Dcusps)
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def destabilize_all(input_grid):
+def destabilize_all(input_grid, return_moves = False):
     r"""
-    Performs all possible (generalized)destabilizations on the grid at once.
+    Performs all possible (generalized)destabilizations on the grid at once. These are
+    the pairs of adjacent rows (or columns) with an X and an O marking in the same 
+    column (or row), which are merged together. Pairs forming a whole 2x2 component
+    are skipped. The sites are examined with a worklist: only the neighbours of the
+    merged rows and columns are checked again after each destabilization, and the
+    grid is renumbered once at the end. The destabilizations are performed in the same
+    order as a repeated scan of the grid, from the lowest row.
+    If "return_moves" is True, the list of destabilizations performed is returned as 
+    well, as Moves ('destabilization', index, 'row' or 'col') where index is the lower
+    (or left) of the two rows (or columns) merged, in the grid at that moment. 
    
     OUTPUT:
 
-    A grid which is not the stabilisation of another grid.
+    A grid which is not the stabilisation of another grid (and the list of moves, if
+    "return_moves" is True).
 
     EXAMPLES::
    
     >> G = generate_unknot(20)
     >> destabilize_all(G)
-   
     [[0, 1], [1, 0]]
+    >> destabilize_all(stabilisation(load_knot('3_1'), 2, 'OSE'), return_moves = True)
+    ([[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]], [Move(kind='destabilization', index=2, subtype='row')])
    
     """
     A = input_grid[0]
     B = input_grid[1]
-    forbidden = 0 
     nn = grid_number(input_grid)
-    if nn == 2:
-        return input_grid
-    while _can_simplify([A,B]) and forbidden ==0:
-        if _check_distance_one([A, B]) != []:
-            horiz = _check_distance_one([A, B])
-            A, B,forbidden = _destabilize_aux([A, B], horiz[0])
-        elif _check_distance_one([B, A]) != []:
-            horiz = _check_distance_one([B, A])
-            B, A,forbidden = _destabilize_aux([B, A], horiz[0])
-        elif _check_distance_one(rotate([A,B],1)) != []:
-            vert = _check_distance_one(rotate([A,B],1))
-            A, B,forbidden = _destabilize_aux(rotate([A,B],1), vert[0])
-            A, B = rotate([A,B],3)
-        elif _check_distance_one(_invert(rotate([A,B],1))) != []:
-            vert = _check_distance_one(_invert(rotate([A,B],1)))
-            B, A,forbidden = _destabilize_aux(_invert(rotate([A,B],1)), vert[0])
-            B, A = rotate([B,A],3)            
-    return([A, B])                
+    Ainv, Binv = [list(L) for L in _inverses(input_grid)]
+    A = list(A)
+    B = list(B)
+    #rows and columns are kept in doubly linked lists, and keep their original labels
+    row_next = list(range(1, nn)) + [-1]
+    row_prev = list(range(-1, nn-1))
+    col_next = list(range(1, nn)) + [-1]
+    col_prev = list(range(-1, nn-1))
+    heads = {'row': 0, 'col': 0}
+    alive = {'row': bytearray([1])*nn, 'col': bytearray([1])*nn}
+    #the position of an original row (column) in the current grid is the number of
+    #rows (columns) still alive before it
+    trees = {'row': [0]*(nn+1), 'col': [0]*(nn+1)}
+    moves = []
+    if return_moves:
+        for i in range(nn):
+            _fenwick_add(trees['row'], i, 1)
+            _fenwick_add(trees['col'], i, 1)
+    def remove(kind, i):
+        following, preceding = (row_next, row_prev) if kind == 'row' else (col_next, col_prev)
+        alive[kind][i] = 0
+        if preceding[i] != -1:
+            following[preceding[i]] = following[i]
+        else:
+            heads[kind] = following[i]
+        if following[i] != -1:
+            preceding[following[i]] = preceding[i]
+        if return_moves:
+            _fenwick_add(trees[kind], i, -1)
+    #the sites are taken in the same order as a repeated scan would: lowest rows with
+    #A[i] == B[i+1] first, then B[i] == A[i+1], then the same on columns. Each heap
+    #holds candidate sites, which are checked again when they are popped
+    def is_site(kind, category, i):
+        if i == -1 or not alive[kind][i]:
+            return False
+        if kind == 'row':
+            k = row_next[i]
+            if k == -1:
+                return False
+            first, second = A[i] == B[k], B[i] == A[k]
+        else:
+            k = col_next[i]
+            if k == -1:
+                return False
+            first, second = Ainv[i] == Binv[k], Binv[i] == Ainv[k]
+        #sites where both hold are 2x2 components, which cannot be removed
+        return first != second and (first if category == 0 else second)
+    order = [('row', 0), ('row', 1), ('col', 0), ('col', 1)]
+    heaps = dict((key, list(range(nn-1))) for key in order)
+    def push(kind, i):
+        if i != -1:
+            heappush(heaps[(kind, 0)], i)
+            heappush(heaps[(kind, 1)], i)
+    size = nn
+    while size > 2:
+        for kind, category in order:
+            heap = heaps[(kind, category)]
+            while heap and not is_site(kind, category, heap[0]):
+                heappop(heap)
+            if heap:
+                break
+        else:
+            break
+        i = heappop(heap)
+        if return_moves:
+            moves.append(Move('destabilization', _fenwick_sum(trees[kind], i), kind))
+        if kind == 'row':
+            k = row_next[i]
+            if category == 0:
+                j = A[i]
+                A[i] = A[k]
+                Ainv[A[i]] = i
+                changed = A[i]
+            else:
+                j = B[i]
+                B[i] = B[k]
+                Binv[B[i]] = i
+                changed = B[i]
+            neighbour = col_prev[j]
+            remove('row', k)
+            remove('col', j)
+            for kk, ii in [('col', neighbour), ('col', col_prev[changed]), ('col', changed), ('row', row_prev[i]), ('row', i)]:
+                push(kk, ii)
+        else:
+            k = col_next[i]
+            if category == 0:
+                j = Ainv[i]
+                Ainv[i] = Ainv[k]
+                A[Ainv[i]] = i
+                changed = Ainv[i]
+            else:
+                j = Binv[i]
+                Binv[i] = Binv[k]
+                B[Binv[i]] = i
+                changed = Binv[i]
+            neighbour = row_prev[j]
+            remove('col', k)
+            remove('row', j)
+            for kk, ii in [('row', neighbour), ('row', row_prev[changed]), ('row', changed), ('col', col_prev[i]), ('col', i)]:
+                push(kk, ii)
+        size -= 1
+    column_rank = [0]*nn
+    c = heads['col']
+    t = 0
+    while c != -1:
+        column_rank[c] = t
+        t += 1
+        c = col_next[c]
+    Anew = []
+    Bnew = []
+    r = heads['row']
+    while r != -1:
+        Anew.append(column_rank[A[r]])
+        Bnew.append(column_rank[B[r]])
+        r = row_next[r]
+    if return_moves:
+        return (_same_type(input_grid, [Anew, Bnew]), moves)
+    return(_same_type(input_grid, [Anew, Bnew]))
 
 #++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def destabilization_sites(input_grid):
+    r'''
+    Lists all the locations where the grid can be destabilized, without building the
+    destabilized grids. Row i is listed when "destabilize(input_grid, i, selection = 'row')"
+    succeeds, and similarly for the columns; this takes a single O(n) pass.
+    
+    OUTPUT: A list [rows, columns] of two increasing lists of indices.
+   
+    EXAMPLES::
+   
+    >> G = [[6, 5, 0, 1, 4, 2, 3], [5, 1, 2, 4, 3, 6, 0]]
+    >> destabilization_sites(G)
+    [[0, 4], [4, 5]]
+    
+    '''
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input grid")
+    if grid_number(input_grid) == 2:
+        return [[], []]
+    Ainv, Binv = _inverses(input_grid)
+    return [_destabilization_rows(input_grid[0], input_grid[1]), _destabilization_rows(Ainv, Binv)]
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def destabilize(input_grid, where, selection = 'row', verbose = False):
     r'''
     Performs a single destabilization move on the grid, if possible at the location 
@@ -580,6 +1715,8 @@ def destabilize(input_grid, where, selection = 'row', verbose = False):
     [[5, 0, 1, 4, 2, 3], [1, 2, 4, 3, 5, 0]]
     
     '''
+    if isinstance(input_grid, Grid):
+        return _same_type(input_grid, destabilize(list(input_grid), where, selection = selection, verbose = verbose))
     A,B = input_grid
     nn = grid_number(input_grid)
     if where > nn-1 or where < 0:
@@ -693,6 +1830,7 @@ def draw_grid(input_grid, color = 0, markings = False, save_fig = False, fig_nam
     Picture saved in the current folder.
 
     """
+    from matplotlib import pyplot as plt
     if check_grid(input_grid) == 1:
         raise Exception("Invalid grid Input!")
     if markings not in ['XO',False, 'dots']:
@@ -724,110 +1862,166 @@ def draw_grid(input_grid, color = 0, markings = False, save_fig = False, fig_nam
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def enumerate_grids(grid_size, path, symmetries = 'dihedral', part = 0, parts = 1, output_format = 'json'):
+    r"""
+    Writes to the file "path" all the grids of the given size, up to torus translations
+    and symmetries of the square (see "iter_grids"). With the 'json' output format the 
+    grids are written one per line in JSON format, together with the number of 
+    components, the writhe, the Thurston-Bennequin number and whether "destabilize_all"
+    shrinks the grid, possibly after a cyclic shift (so that the answer is the same for
+    the whole torus class); note that writhe and Thurston-Bennequin number refer to the representative, as they
+    are not invariant under all the symmetries of the square. With the 'corpus' output
+    format only the grids are written, to a binary corpus (see "GridCorpusWriter"), 
+    which is smaller and faster to read; the invariants can then be computed with 
+    "batch_invariants". The grids are streamed to the file, so that memory does not 
+    grow with their number. The work can be split among several processes: each one 
+    writes a different file, with the same "parts" and a different "part" between 0 
+    and parts-1.
+
+    OUTPUT:
+
+    The number of grids written.
+
+    EXAMPLES::
+
+    >> enumerate_grids(4, 'grids_4.jsonl')
+    8
+    >> open('grids_4.jsonl').readline()
+    '{"grid": [[0, 1, 2, 3], [1, 2, 3, 0]], "components": 1, "writhe": 0, "tb": -3, "destabilizable": true}\n'
+    >> enumerate_grids(5, 'grids_5.grids', output_format = 'corpus')
+    40
+    >> GridCorpusReader('grids_5.grids')[1]
+    [[0, 1, 2, 3, 4], [1, 2, 4, 0, 3]]
+
+    """
+    if output_format not in ['json', 'corpus']:
+        raise Exception("Invalid output format")
+    grids = iter_grids(grid_size, symmetries = symmetries, part = part, parts = parts)
+    if output_format == 'corpus':
+        return write_corpus(path, grids, max_grid_number = grid_size)
+    import json
+    count = 0
+    with open(path, 'w') as f:
+        for G in grids:
+            record = {'grid': G, 'components': number_of_components(G), 'writhe': writhe(G),
+                      'tb': thurston_bennequin(G), 'destabilizable': _destabilizable(G)}
+            f.write(json.dumps(record) + '\n')
+            count += 1
+    return count
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def fill_random_grids(output_array, grids):
+    r"""
+    Fills a preallocated NumPy array of shape (batch, 2, n) with the grids taken from
+    the iterator "grids" (typically produced by "iter_random_grids"), one for each 
+    entry along the first axis. Calling it repeatedly with the same iterator and array
+    streams a large corpus through a fixed amount of memory, for instance to feed the
+    batch functions (see "batch_invariants"). The grids of "iter_random_grids" are 
+    sampled directly into the rows of the array, without building lists for them; the
+    grids of other iterators are copied into it. Most of the time is spent drawing the
+    random numbers, which is done in Python.
+
+    OUTPUT:
+
+    The number of grids written in the array (less than batch if the iterator ends).
+
+    EXAMPLES::
+    
+    >> import numpy as np
+    >> grids = iter_random_grids(6, count = 5, seed = 1, components = 2)
+    >> out = np.empty((4, 2, 6), dtype = np.int32)
+    >> fill_random_grids(out, grids)
+    4
+    >> batch_number_of_components(out)
+    array([2, 2, 2, 2])
+    >> fill_random_grids(out, grids)
+    1
+
+    """
+    shape = getattr(output_array, 'shape', ())
+    if len(shape) != 3 or shape[1] != 2:
+        raise Exception("Invalid output array")
+    if isinstance(grids, _RandomGrids) and grids.grid_size == shape[2]:
+        return grids._fill(output_array)
+    filled = 0
+    for input_grid in grids:
+        if len(input_grid[0]) != shape[2]:
+            raise Exception("Invalid Input")
+        output_array[filled, 0] = input_grid[0]
+        output_array[filled, 1] = input_grid[1]
+        filled += 1
+        if filled == shape[0]:
+            break
+    return filled
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def Gauss_code(input_grid, verbose = False):
     r"""
-    Determines the Gauss code of the given grid diagram. At the moment it only works
-    for knots.
+    Determines the Gauss code of the given grid diagram. For links, there is a 
+    Gauss code for each component (listed starting from the one through the lowest
+    row); components without crossings are omitted. Positive labels denote the over
+    strands (vertical segments) and negative ones the under strands, and the crossings
+    are numbered in the order in which they are first met. 
 
     OUTPUT: 
     
-    A list containing two sublists describing the Gauss code for the input grid.
+    A list containing two sublists describing the Gauss code for the input grid: the
+    Gauss codes of the components, and the signs of the crossings.
 
     EXAMPLES::
     
     >> G = generate_torus_link(3,4)
     >> print(Gauss_code(G))
     [[[-1, -2, 3, 4, -5, -6, 2, 7, -4, 5, -8, 1, -7, -3, 6, 8]], [1, 1, 1, 1, 1, 1, 1, 1]]
+    >> print(Gauss_code(generate_torus_link(2,4)))
+    [[[-1, 2, -3, 4], [-4, 1, -2, 3]], [1, 1, 1, 1]]
     
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid grid Input!")
-    if number_of_components(input_grid) != 1:
-        raise Exception("Right now the Gauss code is only implemented for knots!")
-    empty_cpts=0
     A = input_grid[0]
     B = input_grid[1]
+    n = len(A)
+    Ainv, Binv = _inverses(input_grid)
+    row_crossings, column_crossings = _crossings_lists(input_grid)
+    #crossings are labelled when first met, and found again through their position
+    labels = {}
+    signs = []
+    def label(row, column):
+        key = row*n + column
+        if key not in labels:
+            labels[key] = len(signs) + 1
+            if (A[row] > B[row]) == (Binv[column] > Ainv[column]):
+                signs.append(-1)
+            else:
+                signs.append(1)
+        return labels[key]
     GC = []
-    signs = [] 
-    c = 1
-    coord = [] 
-    rows = [i for i in range(len(A))]
-    while len(rows) > 1:
+    empty_cpts = 0
+    visited = bytearray(n)
+    for start in range(n):
+        if visited[start]:
+            continue
         gc = []
-        where = min(rows)
-        flag = 0
-        start = where
-        while flag ==0:
+        where = start
+        while True:
+            visited[where] = 1
             valueB = B[where]
             valueA = A[where]
-            if valueB < valueA:
-                for kk in range(valueB+1,valueA):
-                    v1 = min(A.index(kk),B.index(kk))
-                    v2 = max(A.index(kk),B.index(kk))
-                    if v1 < where < v2:
-                        pos = [where,kk]
-                        if pos not in coord:
-                            coord.append(pos)
-                            gc.append(-c)
-                            c = c+1
-                            if B.index(kk)> A.index(kk):
-                                signs.append(-1)
-                            if B.index(kk)< A.index(kk):
-                                signs.append(1)
-                        else:
-                            caux = coord.index(pos)+1
-                            gc.append(-caux)
-            if valueB > valueA:
-                for kk in range(valueB-1,valueA,-1):
-                    v1 = min(A.index(kk),B.index(kk))
-                    v2 = max(A.index(kk),B.index(kk))
-                    if v1 < where < v2:
-                        pos = [where,kk]
-                        if pos not in coord:
-                            coord.append(pos)
-                            gc.append(-c)
-                            c = c+1
-                            if B.index(kk)> A.index(kk):
-                                signs.append(1)
-                            if B.index(kk)< A.index(kk):
-                                signs.append(-1)                        
-                        else:
-                            caux = coord.index(pos)+1
-                            gc.append(-caux)
-            if B.index(valueA) > where:
-                for kk in range(where+1,B.index(valueA)):
-                    if min(A[kk],B[kk]) < valueA < max(A[kk],B[kk]):
-                        pos = [kk,valueA]
-                        if pos not in coord:
-                            coord.append(pos)
-                            gc.append(c)
-                            c = c+1
-                            if B[kk]> A[kk]:
-                                signs.append(1)
-                            if B[kk]< A[kk]:
-                                signs.append(-1)
-                        else:   
-                            caux = coord.index(pos)+1
-                            gc.append(caux)
-            if B.index(valueA) < where:
-                for kk in range(where-1,B.index(valueA),-1):
-                    if min(A[kk],B[kk]) < valueA < max(A[kk],B[kk]):
-                        pos = [kk,valueA]
-                        if pos not in coord:
-                            coord.append(pos)
-                            gc.append(c)
-                            c = c+1
-                            if B[kk]> A[kk]:
-                                signs.append(-1)
-                            if B[kk]< A[kk]:
-                                signs.append(1)
-                        else:   
-                            caux = coord.index(pos)+1
-                            gc.append(caux)
-            rows.remove(where)                
-            where = B.index(valueA)
-            if where ==start:
-                flag =1
+            #the horizontal segment goes from the O to the X marking, under the vertical ones
+            crossings = row_crossings[where] if valueB < valueA else reversed(row_crossings[where])
+            for kk in crossings:
+                gc.append(-label(where, kk))
+            #the vertical segment goes from the X to the O marking
+            following = Binv[valueA]
+            crossings = column_crossings[valueA] if following > where else reversed(column_crossings[valueA])
+            for kk in crossings:
+                gc.append(label(kk, valueA))
+            where = following
+            if where == start:
+                break
         if len(gc)>0:        
             GC.append(gc)
         else:
@@ -846,11 +2040,12 @@ def generate_random_grid(grid_size, components = 0):
     input is set to 0 (the default value), then no check on the number of components
     is performed. If instead the "components" variable is set to a positive integer,
     then the output grid will represent a link with the given number of components 
-    (whenever this is possible). The generation is done by randomly sampling two
-    collision-free permutations on n elements; so the grid is truly random, but we 
-    make no claim of ergodicity of this generation method.
-    Furthermore, for large grid sizes, specifying a low number of components might
-    result in long computational times.
+    (whenever this is possible). The X markings are a random permutation, and the O 
+    markings are obtained by composing it with a random derangement, whose cycles are 
+    the components of the link. The derangement is sampled directly with the given 
+    number of cycles (without rejections), so the output is uniformly distributed among 
+    all the grids of the given size (and number of components), in time O(n) for any 
+    number of components (plus the computation of a table of O(n*components) counts).
 
     OUTPUT:
 
@@ -868,20 +2063,11 @@ def generate_random_grid(grid_size, components = 0):
     2
     
     """
-    if components < 0 or components > grid_size or grid_size <= 2:
+    if components < 0 or 2*components > grid_size or grid_size <= 2:
         raise Exception("Wrong number of components or incorrect grid size!")
-    iters = 0
-    while iters < 10000:
-        A = Permutation.random(grid_size).list()
-        B = Permutation.random(grid_size).list()
-        if check_grid([A,B]) == 0:
-            if components == 0:
-                 return [A,B]
-            else:
-                if number_of_components([A,B]) == components:
-                      return [A,B]
-        iters +=1
-    raise Exception("something went wrong in the function! This might be due to the absence of grids with the given number of components in the input dimension.")
+    A = _random_permutation(grid_size)
+    derangement = _random_derangement(grid_size, components)
+    return [A, [A[i] for i in derangement]]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1052,70 +2238,294 @@ def generate_twist_knot(number_of_twists, clasp = '+'):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def grid_length(input_grid):
+def grid_hash(input_grid, symmetries = 'isotopy'):
+    r"""
+    A hash of the grid which is invariant under torus translations and the given 
+    group of symmetries (see "canonical_grid" for the admissible values). Grids 
+    with the same canonical form always have the same hash, hence it can be used 
+    as a key for caches and visited sets of searches. The value does not depend on
+    the Python session.
+    
+    OUTPUT:
+
+    An integer.
+
+    EXAMPLES::
+    
+    >> G = load_knot('3_1')
+    >> grid_hash(G) == grid_hash(cyclic_shift(G,2,4))
+    True
+    >> grid_hash(G) == grid_hash(mirror_grid(G))
+    False
+    
+    """
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input")
+    if symmetries not in _SYMMETRY_GROUPS:
+        raise Exception("Invalid symmetry group")
+    return hash(tuple(_canonical_encoding(input_grid, symmetries)))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def grid_length(input_grid):
+    r"""
+    Computes the length of the grid. This is computed by summing the length of all the
+    segments that compose the grid.
+    
+    OUTPUT:
+
+    Returns the length of the input grid.
+
+    EXAMPLES::
+    
+    >> G = generate_twist_knot(5)
+    >> grid_length(G)
+    56
+    
+    """
+    A = input_grid[0]
+    B = input_grid[1]
+    Ainv, Binv = _inverses(input_grid)
+    return sum([abs(A[i] - B[i]) for i in range(len(A))]) + sum([abs(Ainv[i] - Binv[i]) for i in range(len(A))])
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def grid_number(input_grid):
+    r"""
+    The dimension of the input grid. 
+    
+    OUTPUT:
+
+    The grid number of the given grid.
+
+    EXAMPLES::
+    
+    >> G = generate_twist_knot(5)
+    >> grid_number(G)
+    9
+    
+    """
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input")
+    return(len(input_grid[0]))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def identify_knot(input_grid, radius = 0):
+    r"""
+    Identifies the knot represented by the grid among the knots of "load_knot" and 
+    "load_legendrian_knot", together with their mirror images (denoted by 'm(3_1)', 
+    etc.). The grid is first destabilized as much as possible (see "destabilize_all"),
+    then its canonical form (see "canonical_grid", with either orientation) is looked 
+    up in an index of all the catalog grids, built the first time it is needed; the 
+    lookup takes constant time, after computing the canonical form in linear time. 
+    Only minimal grids can be found in this way, and in general not all of them: if 
+    "radius" is positive, the grids obtained with up to "radius" commutations (of 
+    rows and columns which are adjacent on the torus) followed by destabilizations 
+    are searched too, breadth first. Simplifying the grid first (see "simplify_grid") 
+    makes the search much more likely to succeed.
+
+    OUTPUT:
+
+    The name of the knot ('unknot' if the grid can be destabilized to size 2), or 0 
+    if the knot is not found (or the grid represents a link).
+
+    EXAMPLES::
+
+    >> identify_knot(cyclic_shift(rotate(load_knot('5_2'), 2), 3, 1))
+    '5_2'
+    >> identify_knot(mirror_grid(load_knot('7_6')))
+    'm(7_6)'
+    >> identify_knot(mirror_grid(load_knot('4_1')))
+    '4_1'
+    >> G = [[7, 1, 0, 2, 4, 6, 5, 3], [2, 6, 4, 5, 7, 3, 1, 0]]
+    >> identify_knot(G), identify_knot(G, radius = 1)
+    (0, '8_20')
+
+    """
+    if check_grid(input_grid) == 1:
+        raise Exception("Invalid Input")
+    if type(radius) != type(1) or radius < 0:
+        raise Exception("Invalid radius")
+    if number_of_components(input_grid) != 1:
+        return 0
+    index = _knot_index()
+    G = destabilize_all([list(input_grid[0]), list(input_grid[1])])
+    if len(G[0]) == 2:
+        return 'unknot'
+    key = tuple(_canonical_encoding(G, 'isotopy'))
+    if key in index:
+        return index[key]
+    #breadth first search; the cyclic shift by (1,1) makes the pairs of rows and 
+    #columns which are adjacent across the boundary of the square adjacent 
+    seen = set([key])
+    level = [G]
+    for distance in range(radius):
+        next_level = []
+        for G in level:
+            for H in (G, cyclic_shift(G, 1, 1)):
+                row_codes, column_codes = commutation_sites(H)
+                for where in range(len(row_codes)):
+                    for code, commute in ((row_codes[where], commute_rows), (column_codes[where], commute_columns)):
+                        if code != 'N':
+                            continue
+                        K = destabilize_all(commute(H, where, 'N'))
+                        if len(K[0]) == 2:
+                            return 'unknot'
+                        key = tuple(_canonical_encoding(K, 'isotopy'))
+                        if key in index:
+                            return index[key]
+                        if key not in seen:
+                            seen.add(key)
+                            next_level.append(K)
+        level = next_level
+    return 0
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def invert_orientation(input_grid):
+    r"""
+    Provides a grid representing the same link with the orientation of all of its
+    components inverted. 
+    
+    OUTPUT:
+
+    Returns the reverse of the grid.
+
+    EXAMPLES::
+    
+    >> G = generate_random_grid(7, components=2)
+    >> print(G)
+    [[2, 5, 4, 3, 1, 6, 0], [5, 1, 6, 2, 0, 4, 3]]
+
+    >> invert_orientation(G)
+    [[5, 1, 6, 2, 0, 4, 3], [2, 5, 4, 3, 1, 6, 0]]
+    
+    """
+    return(_same_type(input_grid, [input_grid[1],input_grid[0]]))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def iter_grids(grid_size, symmetries = 'dihedral', part = 0, parts = 1):
     r"""
-    Computes the length of the grid. This is computed by summing the length of all the
-    segments that compose the grid.
-    
+    Generates all the grids of the given size, one for each class under the torus 
+    translations and the group "symmetries" ('translations', 'isotopy' or 'dihedral', 
+    see "canonical_grid"). Each grid is produced in its canonical form. 
+    The rows of a grid are encoded as in "canonical_grid", so that the classes under 
+    translations are the necklaces of these codes: they are generated in 
+    lexicographic order with the algorithm of Fredricksen, Kessler and Maiorana, 
+    discarding as soon as possible the prefixes in which two X or two O markings share 
+    a column. A necklace is kept if no symmetry gives a smaller one. The work can be 
+    split by prefix: only the prefixes of length 2 with index congruent to "part" 
+    modulo "parts" are explored.
+
     OUTPUT:
 
-    Returns the length of the input grid.
+    A generator of grids.
 
     EXAMPLES::
-    
-    >> G = generate_twist_knot(5)
-    >> grid_length(G)
-    56
-    
+
+    >> list(iter_grids(3))
+    [[[0, 1, 2], [1, 2, 0]]]
+    >> len(list(iter_grids(5))), len(list(iter_grids(5, 'translations')))
+    (40, 224)
+
     """
-    A = input_grid[0]
-    B = input_grid[1]
-    Ar, Br = rotate([A,B],1)
-    return sum([abs(A[i] - B[i]) for i in range(len(A))]) + sum([abs(Ar[i] - Br[i]) for i in range(len(A))])
+    if type(grid_size) != type(1) or grid_size < 2:
+        raise Exception("Invalid grid size")
+    if symmetries not in _SYMMETRY_GROUPS:
+        raise Exception("Invalid symmetry group")
+    if type(parts) != type(1) or parts < 1 or type(part) != type(1) or not 0 <= part < parts:
+        raise Exception("Invalid part")
+    for code in _grid_necklaces(grid_size, part, parts):
+        n = grid_size
+        A = [0]
+        B = []
+        for i in range(n):
+            B.append((A[i] + code[i] % n) % n)
+            if i < n-1:
+                A.append((A[i] + code[i]//n) % n)
+        #the first image is the grid itself, whose encoding is code
+        images = _symmetric_encodings([A,B], symmetries)
+        next(images)
+        if all(image >= code for image in images):
+            yield [A,B]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def grid_number(input_grid):
+def iter_moves(input_grid, unique = False, grids = False):
     r"""
-    The dimension of the input grid. 
+    Lazily produces the Cromwell moves which can be performed on the input grid (not 
+    including cyclic shifts), in the same order as "perform_all_moves". Each move is 
+    yielded as a "Move" descriptor, which can be performed with "apply_move"; the moves 
+    are found without building the grids they produce. If "grids" is True, pairs 
+    (move, grid) are yielded, where grid is the result of the move. If "unique" is True,
+    moves producing the same grid as an earlier one are skipped: this is checked with a
+    hash set of the resulting grids, so each of them is built.
     
     OUTPUT:
 
-    The grid number of the given grid.
+    A generator of moves, or of pairs (move, grid).
 
     EXAMPLES::
     
-    >> G = generate_twist_knot(5)
-    >> grid_number(G)
-    9
+    >> G = [[0,1],[1,0]]
+    >> M = list(iter_moves(G))
+    >> len(M)
+    16
+    >> len(list(iter_moves(G, unique = True)))
+    8
+    >> M[0]
+    Move(kind='stabilisation', index=0, subtype='XNE')
+    >> apply_move(G, M[-1])
+    [[0, 2, 1], [2, 1, 0]]
     
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid Input")
-    return(len(input_grid[0]))
+    seen = set()
+    for move in _move_candidates(input_grid):
+        if unique or grids:
+            out_grid = apply_move(input_grid, move)
+            if unique:
+                key = (tuple(out_grid[0]), tuple(out_grid[1]))
+                if key in seen:
+                    continue
+                seen.add(key)
+        if grids:
+            yield (move, out_grid)
+        else:
+            yield move
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def invert_orientation(input_grid):
+def iter_random_grids(grid_size, count = None, seed = 0, components = 0, stream = 0):
     r"""
-    Provides a grid representing the same link with the orientation of all of its
-    components inverted. 
-    
+    Generates "count" random grids of the given size (or infinitely many if count is
+    None), distributed as in "generate_random_grid". The grids are produced one at a
+    time, so that arbitrarily large corpora can be streamed in constant memory. The 
+    random numbers are drawn from a private generator determined by "seed" and "stream"
+    (not from the global one), so that the same grids are obtained in every process; 
+    different workers should use the same seed with different streams.
+
     OUTPUT:
 
-    Returns the reverse of the grid.
+    An iterator of grids.
 
     EXAMPLES::
     
-    >> G = generate_random_grid(7, components=2)
-    >> print(G)
-    [[2, 5, 4, 3, 1, 6, 0], [5, 1, 6, 2, 0, 4, 3]]
+    >> list(iter_random_grids(5, count = 2, seed = 7))
+    [[[0, 3, 1, 2, 4], [4, 1, 3, 0, 2]], [[1, 3, 4, 0, 2], [2, 1, 0, 3, 4]]]
+    >> G = next(iter_random_grids(100, seed = 7, components = 3, stream = 12))
+    >> number_of_components(G)
+    3
 
-    >> invert_orientation(G)
-    [[5, 1, 6, 2, 0, 4, 3], [2, 5, 4, 3, 1, 6, 0]]
-    
     """
-    return([input_grid[1],input_grid[0]])
+    if components < 0 or 2*components > grid_size or grid_size <= 2:
+        raise Exception("Wrong number of components or incorrect grid size!")
+    if count is not None and count < 0:
+        raise Exception("Invalid count")
+    return _RandomGrids(grid_size, count, Random('%s-%s' %(seed, stream)), components)
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1146,12 +2556,11 @@ def load_knot(knot_name, verbose = False):
     [[3, 0, 8, 7, 6, 5, 2, 1, 4], [8, 7, 6, 5, 4, 1, 0, 3, 2]]
     
     """
-    list_of_knots = {'3_1': [[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]], '4_1': [[5, 0, 3, 4, 2, 1], [2, 4, 5, 1, 0, 3]], '5_1':[[4,5, 6, 0, 1, 2, 3], [6, 2, 3, 4, 5, 0, 1]], '5_2': [[1, 5, 6, 2, 3, 4, 0], [6, 0, 4, 5, 1, 2, 3]],'6_1': [[7, 0, 5, 6, 3, 4, 2, 1], [2, 6, 7, 4, 5, 1, 0, 3]], '6_2': [[7, 2, 4, 5, 6, 1, 0, 3], [5,6, 7, 0, 3, 4, 2, 1]], '6_3': [[7, 0, 3, 5, 6, 4, 2, 1], [3, 4, 6, 7, 2, 1, 0, 5]], '7_1': [[1, 6,7, 8, 0, 2, 3, 4, 5], [8, 0, 1, 4, 5, 6, 7, 2, 3]], '7_2': [[1, 7, 8, 5, 6, 2, 3, 4, 0], [8, 0, 6,7,4, 5, 1, 2, 3]], '7_3': [[3, 0, 8, 7, 6, 5, 2, 1, 4], [8, 7, 6, 5, 4, 1, 0, 3, 2]], '7_4': [[5, 0,8, 2, 1, 7, 4, 3, 6], [8, 7, 1, 0, 6, 3, 2, 5, 4]], '7_5': [[2, 7, 8, 0, 3, 4, 5, 6, 1], [8, 0, 1,6,7, 2, 3, 4, 5]], '7_6': [[1, 7, 8, 3, 2, 4, 5, 6, 0], [8, 0, 2, 1, 6, 7, 3, 4, 5]], '7_7': [[1, 4,7, 8, 6, 3, 2, 5, 0], [8, 0, 2, 5, 1, 7, 4, 3, 6]], '8_1': [[9, 5, 6, 3, 4, 1, 2, 8, 7, 0], [6, 7,4,5, 2, 3, 0, 1, 9, 8]], '8_2': [[9, 0, 8, 1, 7, 2, 3, 4, 5, 6], [1, 7, 2, 3, 9, 4, 5, 6, 8, 0]],'8_3': [[4, 7, 6, 9, 8, 2, 3, 0, 1, 5], [6, 5, 8, 7, 3, 4, 1, 2, 9, 0]], '8_4': [[1, 0, 3, 2, 8,9,4, 5, 6, 7], [9, 2, 1, 4, 3, 5, 6, 7, 8, 0]], '8_5': [[5, 0, 10, 9, 7, 8, 4, 3, 2, 1, 6],[10, 9,8,3, 2, 6, 7, 1, 5, 4, 0]], '8_6': [[9, 3, 2, 0, 7, 8, 1, 4, 5, 6], [2, 1, 8, 3, 9, 4, 5, 6, 7, 0]],'8_7': [[9, 0, 6, 7, 8, 5, 4, 3, 2, 1], [5, 7, 8, 9, 4, 3, 2, 1, 0, 6]], '8_8': [[9, 0, 3, 7, 2,1,5, 4, 8, 6], [1, 7, 8, 9, 4, 3, 2, 6, 5, 0]], '8_9': [[1, 0, 8, 9, 4, 3, 2, 5, 6, 7], [9, 4, 3, 5,2, 1, 6, 7, 8, 0]], '8_10': [[8, 2, 5, 6, 7, 4, 3, 1, 0, 10, 9], [3, 6, 7, 8, 10, 9, 5, 4, 2, 1, 0]],'8_11': [[9, 0, 8, 4, 7, 3, 5, 1, 2, 6], [4, 7, 5, 6, 9, 8, 2, 3, 0, 1]], '8_12': [[2, 3, 0, 1, 5,6, 9, 8, 4, 7], [8, 1, 2, 6, 7, 4, 5, 3, 9, 0]], '8_13': [[9, 0, 5, 7, 8, 4, 2, 3, 1, 6], [4, 7, 8,9, 3, 1, 0, 6, 5, 2]], '8_14': [[9, 2, 8, 3, 7, 4, 0, 1, 5,6], [3, 7, 4, 5, 9, 1, 2, 6, 8, 0]], '8_15': [[10, 1, 6, 8, 7, 2, 3, 4, 5, 9, 0],  [2, 8, 9, 10, 3,6,0, 7, 1, 4, 5]], '8_16': [[2, 1, 7, 8, 3, 5, 4, 9, 0, 10, 6],  [9, 5, 10, 6, 7, 8, 2, 3, 4, 1, 0]],'8_17': [[6, 8, 9, 2, 3, 5, 4, 1, 0, 7], [9, 1, 3, 4, 7, 8, 0, 6, 5, 2]], '8_18': [[2, 1, 3, 4, 0,6, 7, 9, 8, 5], [9, 7, 8, 2, 3, 1, 5, 6, 4, 0]], '8_19': [[2, 1, 0, 6, 5, 4, 3], [6, 5, 4, 3, 2, 1,0]], '8_20': [[7, 1, 0, 3, 4, 6, 5, 2], [3, 6, 4, 5, 7, 2, 1, 0]], '8_21': [[7, 0, 3, 5, 4, 6, 1, 2],[4, 6, 7, 1, 0, 2, 3, 5]] }
-    if knot_name not in list_of_knots.keys():
+    if knot_name not in _KNOTS:
         raise Exception("Invalid input name! Try the command 'available_knots' to see which knots are pre-loaded.")
     if verbose == True:
         print("\nCheck out some of this knot's invariants at the Knot Atlas:\nhttp://katlas.org/wiki/%s \nand Knotinfo:\n https://knotinfo.math.indiana.edu/results.php?searchmode=singleknot&desktopmode=0&mobilemode=0&singleknotprev=&submittype=singleknot&singleknot=%s" %(knot_name,knot_name))
-    return list_of_knots[knot_name]
+    return [list(_KNOTS[knot_name][0]), list(_KNOTS[knot_name][1])]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1181,15 +2590,15 @@ def load_legendrian_knot(knot_name, random_repr = True):
     [[3, 1, 8, 7, 6, 5, 0, 4, 2], [8, 7, 6, 5, 4, 2, 3, 1, 0]]]
     
     """
-    list_of_legendrian = {'3_1': [[[4, 0, 1, 2, 3], [1, 2, 3, 4, 0]]], 'm(3_1)': [[[4, 3, 2, 1, 0], [1, 0, 4, 3, 2]]], '4_1': [[[5, 0, 3, 4, 2, 1], [2, 4, 5, 1, 0, 3]]], '5_1': [[[4, 5, 6, 0, 1, 2, 3], [6, 2, 3, 4, 5, 0, 1]], [[1, 2, 3, 4, 5, 6, 0], [6, 0, 1, 2, 3, 4, 5]]], 'm(5_1)': [[[1, 0, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 1, 0]]], '5_2': [[[1, 5, 6, 2, 3, 4, 0], [6, 0, 4, 5, 1, 2, 3]]], 'm(5_2)': [[[3, 0, 6, 5, 2, 1, 4], [6, 5, 4, 1, 0, 3, 2]], [[3, 1, 6, 5, 0, 4, 2], [6, 5, 4, 2, 3, 1, 0]]], '6_1': [[[7, 0, 5, 6, 3, 4, 2, 1], [2, 6, 7, 4, 5, 1, 0, 3]]], 'm(6_1)': [[[7, 0, 5, 6, 2, 1, 4, 3], [4, 6, 7, 1, 0, 3, 2, 5]], [[7, 2, 5, 6, 4, 1, 0, 3], [4, 6, 7, 3, 0, 5, 2, 1]]], '6_2': [[[7, 2, 4, 5, 6, 1, 0, 3], [5, 6, 7, 0, 3, 4, 2, 1]], [[7, 0, 6, 4, 1, 2, 3, 5], [1, 4, 2, 7, 3, 5, 6, 0]], [[7, 6, 4, 5, 0, 1, 2, 3], [5, 0, 7, 1, 2, 3, 4, 6]]], 'm(6_2)': [[[7, 6, 5, 4, 1, 0, 2, 3], [2, 0, 7, 6, 5, 3, 4, 1]]], '6_3': [[[7, 0, 3, 5, 6, 4, 2, 1], [3, 4, 6, 7, 2, 1, 0, 5]], [[7, 6, 5, 3, 4, 0, 1, 2], [5, 4, 0, 7, 1, 2, 3, 6]]], '7_1': [[[1, 6, 7, 8, 0, 2, 3, 4, 5], [8, 0, 1, 4, 5, 6, 7, 2, 3]], [[6, 7, 8, 0, 1, 2, 3, 4, 5], [8, 4, 5, 6, 7, 0, 1, 2, 3]], [[1, 2, 3, 4, 5, 6, 7, 8, 0], [8, 0, 1, 2, 3, 4, 5, 6, 7]]], 'm(7_1)': [[[1, 0, 8, 7, 6, 5, 4, 3, 2], [8, 7, 6, 5, 4, 3, 2, 1, 0]]], '7_2': [[[1, 7, 8, 5, 6, 2, 3, 4, 0], [8, 0, 6, 7, 4, 5, 1, 2, 3]]], 'm(7_2)': [[[5, 0, 8, 7, 2, 1, 4, 3, 6], [8, 7, 6, 1, 0, 3, 2, 5, 4]], [[5, 2, 8, 7, 0, 1, 6, 3, 4], [8, 7, 6, 4, 5, 3, 2, 0, 1]], [[5, 3, 8, 7, 0, 6, 2, 1, 4], [8, 7, 6, 4, 5, 1, 0, 3, 2]], [[5, 3, 8, 7, 1, 6, 0, 4, 2], [8, 7, 6, 4, 5, 2, 3, 1, 0]]], '7_3': [[[3, 0, 8, 7, 6, 5, 2, 1, 4], [8, 7, 6, 5, 4, 1, 0, 3, 2]], [[3, 1, 8, 7, 6, 5, 0, 4, 2], [8, 7, 6, 5, 4, 2, 3, 1, 0]]], 'm(7_3)': [[[4, 7, 8, 5, 6, 0, 1, 2, 3], [8, 2, 6, 7, 3, 4, 5, 0, 1]], [[1, 7, 8, 2, 3, 4, 5, 6, 0], [8, 0, 6, 7, 1, 2, 3, 4, 5]]], '7_4': [[[5, 0, 8, 2, 1, 7, 4, 3, 6], [8, 7, 1, 0, 6, 3, 2, 5, 4]], [[5, 2, 8, 0, 7, 4, 3, 1, 6], [8, 7, 3, 6, 1, 2, 0, 5, 4]], [[6, 3, 8, 0, 7, 5, 2, 1, 4], [8, 7, 5, 6, 4, 1, 0, 3, 2]], [[6, 3, 8, 1, 7, 5, 0, 4, 2], [8, 7, 5, 6, 4, 2, 3, 1, 0]]], 'm(7_4)': [[[1, 7, 8, 2, 5, 6, 3, 4, 0], [8, 0, 6, 7, 1, 4, 5, 2, 3]]], '7_5': [[[2, 7, 8, 0, 3, 4, 5, 6, 1], [8, 0, 1, 6, 7, 2, 3, 4, 5]], [[1, 7, 8, 2, 4, 3, 5, 6, 0], [8, 0, 4, 6, 7, 1, 2, 3, 5]], [[4, 7, 8, 3, 5, 6, 0, 1, 2], [8, 1, 6, 7, 2, 3, 4, 5, 0]], [[1, 6, 7, 8, 2, 3, 4, 5, 0], [8, 0, 5, 6, 7, 1, 2, 3, 4]]], 'm(7_5)': [[[3, 0, 8, 7, 6, 2, 1, 5, 4], [8, 7, 6, 5, 1, 0, 4, 3, 2]], [[4, 1, 8, 7, 6, 0, 5, 3, 2], [8, 7, 6, 5, 3, 4, 2, 1, 0]]], '7_6': [[[1, 7, 8, 3, 2, 4, 5, 6, 0], [8, 0, 2, 1, 6, 7, 3, 4, 5]], [[5, 7, 8, 0, 1, 3, 2, 6, 4], [8, 2, 6, 4, 7, 0, 5, 3, 1]], [[5, 7, 8, 4, 0, 6, 1, 2, 3], [8, 2, 6, 7, 5, 3, 4, 0, 1]]], 'm(7_6)': [[[2, 0, 8, 7, 5, 6, 4, 3, 1], [8, 7, 6, 1, 0, 3, 2, 5, 4]], [[3, 7, 8, 2, 1, 6, 5, 0, 4], [8, 0, 6, 7, 5, 4, 2, 3, 1]], [[3, 0, 8, 7, 5, 6, 2, 1, 4], [8, 7, 6, 1, 0, 4, 5, 3, 2]]], '7_7': [[[1, 4, 7, 8, 6, 3, 2, 5, 0], [8, 0, 2, 5, 1, 7, 4, 3, 6]], [[1, 5, 7, 8, 4, 3, 2, 6, 0], [8, 0, 2, 6, 7, 1, 5, 4, 3]], [[2, 0, 8, 4, 3, 6, 5, 7, 1], [8, 7, 1, 0, 5, 4, 2, 3, 6]]], 'm(7_7)': [[[3, 7, 8, 1, 0, 6, 4, 5, 2], [8, 0, 6, 7, 5, 2, 1, 3, 4]], [[3, 7, 8, 2, 5, 6, 1, 0, 4], [8, 1, 6, 7, 0, 4, 5, 3, 2]]]}
-    if knot_name not in list_of_legendrian.keys():
+    if knot_name not in _LEGENDRIAN_KNOTS:
         raise Exception("Invalid input name! Try the command 'available_knots' to see which knots are pre-loaded.")
+    list_of_legendrian = [[list(A), list(B)] for A, B in _LEGENDRIAN_KNOTS[knot_name]]
     if random_repr == True:
-        n = len(list_of_legendrian[knot_name])
-        return list_of_legendrian[knot_name][randrange(0,n)]
-    if len(list_of_legendrian[knot_name]) == 1:
-        return list_of_legendrian[knot_name][0]
-    return list_of_legendrian[knot_name]
+        n = len(list_of_legendrian)
+        return list_of_legendrian[randrange(0,n)]
+    if len(list_of_legendrian) == 1:
+        return list_of_legendrian[0]
+    return list_of_legendrian
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1235,8 +2644,9 @@ def number_of_components(input_grid):
     """
     A = input_grid[0]
     B = input_grid[1]
-    VAR = ((Permutation(A)**(-1))*Permutation(B)).cycle_structure
-    return sum([VAR[r] for r in VAR if r != 1])
+    #each component is a cycle of the permutation sending the column of an X marking
+    #to the column of the O marking in the same row
+    return _count_cycles(_compose_permutations(_inverses(input_grid)[0], B), fixed_points = False)
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1260,25 +2670,26 @@ def parallel_copies(input_grid, strands):
     if strands <0:
         raise Exception("Invalid number of strands")
     A,B = input_grid
+    Ainv, Binv = _inverses(input_grid)
     Aout,Bout = [],[]
     for i in range(len(A)):
-        if A[i] < B[i] and B.index(A[i]) < i:
+        if A[i] < B[i] and Binv[A[i]] < i:
             Aout += [strands*(A[i]+1)-t-1 for t in range(strands)]
-        elif A[i]> B[i] and B.index(A[i]) < i:
+        elif A[i]> B[i] and Binv[A[i]] < i:
             Aout += [strands*A[i]+t for t in range(strands)]
-        elif A[i] < B[i] and B.index(A[i]) > i:
+        elif A[i] < B[i] and Binv[A[i]] > i:
             Aout += [strands*A[i]+t for t in range(strands)]
-        elif A[i] > B[i] and B.index(A[i]) > i:
+        elif A[i] > B[i] and Binv[A[i]] > i:
             Aout += [strands*(A[i]+1)-t-1 for t in range(strands)]
-        if B[i] < A[i] and A.index(B[i]) < i:
+        if B[i] < A[i] and Ainv[B[i]] < i:
             Bout += [strands*(B[i]+1)-t-1 for t in range(strands)]
-        elif B[i]> A[i] and A.index(B[i]) < i:
+        elif B[i]> A[i] and Ainv[B[i]] < i:
             Bout += [strands*B[i]+t for t in range(strands)]
-        elif B[i] < A[i] and A.index(B[i]) > i:
+        elif B[i] < A[i] and Ainv[B[i]] > i:
             Bout += [strands*B[i]+t for t in range(strands)]
-        elif B[i] > A[i] and A.index(B[i]) > i:
+        elif B[i] > A[i] and Ainv[B[i]] > i:
             Bout += [strands*(B[i]+1)-t-1 for t in range(strands)]
-    return([Aout,Bout])
+    return(_same_type(input_grid, [Aout,Bout]))
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1316,28 +2727,69 @@ def perform_all_moves(input_grid):
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid Input")
-    nn = grid_number(input_grid)
-    out_grids = []
-    for i in range(nn):
-        for stab_type in ['XNE','XNW','XSE','XSW','ONE','ONW','OSE','OSW']:
-            out_aux = stabilisation(input_grid, row = i, kind = stab_type)
-            if out_aux not in out_grids:
-                out_grids.append(out_aux)
-    for i in range(nn-1):
-        out_comm_cols = commute_columns(input_grid, where = i, interleaving = 'N')
-        if out_comm_cols != 0 and out_comm_cols not in out_grids:
-            out_grids.append(out_comm_cols)
-        out_comm_rows = commute_rows(input_grid, where = i, interleaving = 'N')
-        if out_comm_rows != 0 and out_comm_rows not in out_grids:
-            out_grids.append(out_comm_rows)
-    for i in range(nn):
-        out_destab_row = destabilize(input_grid, i, selection = 'row')
-        if out_destab_row != 0 and out_destab_row not in out_grids:
-            out_grids.append(out_destab_row)
-        out_destab_col = destabilize(input_grid, i, selection = 'col')
-        if out_destab_col != 0 and out_destab_col not in out_grids:
-            out_grids.append(out_destab_col)
-    return out_grids
+    return [out_grid for move, out_grid in iter_moves(input_grid, unique = True, grids = True)]
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def reduce_braid(braid_word, verbose = False):
+    r"""
+    Shortens a braid word (as produced by "convert_to_braid") without changing the 
+    link represented by its closure. The following steps are repeated until nothing 
+    changes: free reduction of pairs of inverse generators, also when they are only
+    separated by commuting generators (i.e. at distance at least 2), which are put in
+    a normal order; cyclic reduction, removing inverse generators at the two ends of 
+    the word (a conjugation); Markov destabilization of the top or the bottom strand,
+    when the corresponding generator appears exactly once. The number of strands is 
+    the largest generator plus one: if the top strands split off as trivial components,
+    the word ends with a cancelling pair of generators keeping track of them, and the 
+    trivial braid on one strand is returned as [1], as in "convert_to_braid". 
+    If "verbose" is True the lengths and the number of strands before and after the 
+    reduction are printed.
+
+    OUTPUT:
+
+    A list of integers representing a braid word.
+
+    EXAMPLES::
+    
+    >> reduce_braid([1, 2, -1, 2, -3, 2, 1], verbose = True)
+    Braid reduction from 7 to 6 generators, and from 4 to 3 strands
+    [2, 1, 1, 2, -1, 2]
+    >> reduce_braid([1, 2, 3])
+    [1]
+    >> reduce_braid([1, 2, -2, 1])
+    [1, 1, 2, -2]
+    
+    """
+    if any(type(g) != type(1) or g == 0 for g in braid_word):
+        raise Exception("Invalid braid word")
+    word = list(braid_word)
+    length = len(word)
+    strands = max([abs(g) for g in word] + [0]) + 1
+    initial_strands = strands
+    while True:
+        previous = (len(word), strands)
+        word = _cyclically_reduce_braid(_freely_reduce_braid(word))
+        indices = [abs(g) for g in word]
+        if strands > 1 and indices.count(strands-1) == 1:
+            #w = u s v becomes v u, on one strand less
+            where = indices.index(strands-1)
+            word = word[where+1:] + word[:where]
+            strands -= 1
+        elif strands > 1 and indices.count(1) == 1:
+            #the same on the bottom strand, after which the strands are renumbered
+            where = indices.index(1)
+            word = [g-1 if g > 0 else g+1 for g in word[where+1:] + word[:where]]
+            strands -= 1
+        if (len(word), strands) == previous:
+            break
+    if verbose == True:
+        print('Braid reduction from %s to %s generators, and from %s to %s strands' %(length, len(word), initial_strands, strands))
+    if strands == 1:
+        return [1]
+    if max([abs(g) for g in word] + [0]) < strands-1:
+        word += [strands-1, 1-strands]
+    return word
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1362,12 +2814,15 @@ def rotate(input_grid, number_rotations):
     [[0,1,2,3,4],[2,3,4,0,1]]
     
     """
+    transform = (False, False, False)
+    for i in range(max(number_rotations, 0) % 4):
+        transform = _compose_symmetries((True, False, True), transform)
+    if isinstance(input_grid, Grid):
+        return input_grid._view(transform)
     A = input_grid[0]
     B = input_grid[1]
-    for i in range(number_rotations):
-        A = rotate_once(A)
-        B = rotate_once(B)
-    return([A, B])
+    Ainv, Binv = _inverses(input_grid)
+    return([_apply_symmetry(A, Ainv, transform), _apply_symmetry(B, Binv, transform)])
     
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1386,7 +2841,8 @@ def rotate_once(input_list):
     [4, 3, 2, 1, 0]
     
     """
-    return [len(input_list)-input_list.index(a)-1 for a in range(len(input_list))] 
+    n = len(input_list)
+    return [n-a-1 for a in _inverse_permutation(input_list)]
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1475,18 +2931,12 @@ def scramble_grid(input_grid, effort = 'medium', legendrian = False, transverse
             A,B = cyclic_shift([A,B], randrange(0,n+1), randrange(0,n+1))
             count += 1
         elif dice  == 1:
-            possible_rows = []
-            for iterator in range(n-1):   #why is it < n-1 here? 
-                if _check_rows([A,B],iterator) == True:
-                    possible_rows.append(iterator)
+            possible_rows = [i for i, code in enumerate(_commutation_codes(A, B)) if code == 'N']
             if len(possible_rows) > 0:
                 A,B = commute_rows([A,B],possible_rows[randrange(0,len(possible_rows))])
                 count += 1
         elif dice == 2:
-            possible_cols = []
-            for iterator in range(n-1):   
-                if _check_columns([A,B],iterator) == True:
-                    possible_cols.append(iterator)
+            possible_cols = [i for i, code in enumerate(_commutation_codes(*_inverses([A,B]))) if code == 'N']
             if len(possible_cols) > 0:
                 A,B = commute_columns([A,B],possible_cols[randrange(0,len(possible_cols))])
                 count += 1
@@ -1503,13 +2953,11 @@ def scramble_grid(input_grid, effort = 'medium', legendrian = False, transverse
             count += 1
         elif dice == 4:
             if legendrian == False and transverse == False:
-                possible_stabs_row = []
-                possible_stabs_col = []
-                for iterator in range(n-1):
-                    if destabilize([A,B], iterator, selection = 'row', verbose = False) != 0:
-                        possible_stabs_row.append(iterator)
-                    if destabilize([A,B], iterator, selection = 'col', verbose = False) != 0:
-                        possible_stabs_col.append(iterator)
+                possible_stabs_row, possible_stabs_col = destabilization_sites([A,B])
+                if possible_stabs_row and possible_stabs_row[-1] == n-1:
+                    possible_stabs_row.pop()
+                if possible_stabs_col and possible_stabs_col[-1] == n-1:
+                    possible_stabs_col.pop()
                 if len(possible_stabs_row)*len(possible_stabs_col) != 0:
                     coin = randrange(0,2)
                     if coin == 0:
@@ -1518,7 +2966,7 @@ def scramble_grid(input_grid, effort = 'medium', legendrian = False, transverse
                     else:
                         A,B = destabilize([A,B], possible_stabs_col[randrange(len(possible_stabs_col))], selection = 'col', verbose = False)
                         count += 1
-    return [A,B]
+    return _same_type(input_grid, [A,B])
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1542,7 +2990,8 @@ def self_linking(input_grid):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def simplify_grid(input_grid, effort = 'medium', verbose = False):
+def simplify_grid(input_grid, effort = 'medium', verbose = False, restarts = 1, workers = 1, seed = None, return_stats = False,
+                  strategy = 'random', time_limit = None, beam_width = 2, target_size = None, patience = None):
     r"""
     Simplifies the given grid diagram, using an algorithm similar to Gridlink's built-in
     function (see http://homepages.math.uic.edu/~culler/gridlink/). 
@@ -1551,10 +3000,28 @@ def simplify_grid(input_grid, effort = 'medium', verbose = False):
     destabilizations), which are 200, 1000 or 10000 respectively. 
     If the "verbose" option is True (which is the default value) the amount of simplification
     is printed.
+    The simplification is random, and "restarts" independent runs can be performed, 
+    returning the smallest grid found (ties are broken by "grid_length"). The runs are 
+    distributed over "workers" processes. If "seed" is given, each run uses its own 
+    random generator seeded from it and from the index of the run, so that the result
+    does not depend on the number of workers; otherwise a single run uses the global
+    random generator as before. If "return_stats" is True, a list with the statistics
+    of each run (see "SimplifyStats") is also returned.
+    The default "strategy" is 'random', which applies cyclic shifts and commutations
+    at random. With 'anneal' the moves are scored with an energy, the length of the 
+    grid (see "grid_length"): shorter segments lead to destabilizations, and moves 
+    increasing the energy are accepted less and less often, as in simulated annealing.
+    With 'beam' the "beam_width" best grids (by grid number, then length) are kept, 
+    and a few random commutations and cyclic shifts of each of them are tried at each
+    step, never returning to a grid already seen. For these two strategies the effort is the 
+    number of moves tried.
+    Each run also stops after "time_limit" seconds, as soon as its grid number is at 
+    most "target_size", or when its grid has not shrunk in the last "patience" moves.
     
     OUTPUT:
 
-    A simplified grid, representing the same knot type.
+    A simplified grid, representing the same knot type (and the list of statistics, 
+    if "return_stats" is True).
 
     EXAMPLES::
     
@@ -1572,11 +3039,35 @@ def simplify_grid(input_grid, effort = 'medium', verbose = False):
     
     Grid simplification from 20 to 4
     [[3, 0, 1, 2], [1, 2, 3, 0]]
+
+    >> G = scramble_grid(load_knot('5_2'), 'high')
+    >> H, stats = simplify_grid(G, restarts = 32, workers = 8, seed = 1, return_stats = True)
+    >> len(stats), grid_number(H)
+    (32, 7)
+
+    >> G = scramble_grid(load_knot('7_4'), 3000)
+    >> grid_number(G), grid_number(simplify_grid(G, effort = 'low', strategy = 'anneal', time_limit = 10))
+    (80, 9)
+
+    >> H, stats = simplify_grid(G, 'high', strategy = 'anneal', target_size = 9, return_stats = True)
+    >> stats[0].stopped, stats[0].sizes[-1]
+    ('target', (157, 9))
     
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid Input")
-    count = 0
+    if type(restarts) != type(1) or type(workers) != type(1) or restarts < 1 or workers < 1:
+        raise Exception("Invalid number of restarts or workers!")
+    if strategy not in ['random', 'anneal', 'beam']:
+        raise Exception("Invalid strategy!")
+    if time_limit is not None and not time_limit > 0:
+        raise Exception("Invalid time limit!")
+    if type(beam_width) != type(1) or beam_width < 1:
+        raise Exception("Invalid beam width!")
+    if target_size is not None and (type(target_size) != type(1) or target_size < 2):
+        raise Exception("Invalid target size!")
+    if patience is not None and (type(patience) != type(1) or patience < 1):
+        raise Exception("Invalid patience!")
     A,B = input_grid
     if effort not in ['low', 'high', 'medium']:
         if type(effort) != type(1):
@@ -1584,46 +3075,34 @@ def simplify_grid(input_grid, effort = 'medium', verbose = False):
         else:
             if effort < 1:
                 raise Exception("Invalid effort!")
+        tries = effort
     elif effort == 'low':
         tries = 200
     elif effort == 'medium':
         tries = 1000
     elif effort == 'high':
         tries = 10000    
+    limits = (time_limit, target_size, patience)
+    if seed is None and restarts == 1:
+        stats = SimplifyStats(None, strategy, *limits)
+        A,B = _simplify_strategy(list(A), list(B), tries, randrange, _random_float, strategy, beam_width, stats)
+        runs = [(A, B, stats)]
     else:
-        tries = effort
-    while count < tries and len(A)>3:
-        A,B = destabilize_all([A,B])
-        n = len(A)
-        dice = randrange(0,3)
-        if dice == 0:
-            D = cyclic_shift([A,B], randrange(0,n+1), randrange(0,n+1))
-            A = D[0]
-            B = D[1]
-            count += 1
-        elif dice ==1:
-            done = 0
-            iterator = 0
-            while done ==0 and iterator<n-1:
-                if _check_rows([A,B],iterator) == True:
-                    A,B = commute_rows([A,B],iterator)
-                    done =1
-                    count += 1
-                else:
-                    iterator += 1
-        elif dice ==2:
-            done = 0
-            iterator = 0
-            while done ==0 and iterator<n-1:
-                if _check_columns([A,B],iterator) == True:
-                    A,B = commute_columns([A,B],iterator)
-                    done =1    
-                    count += 1
-                else:
-                    iterator += 1
+        if seed is None:
+            seed = randrange(0, 2**31)
+        jobs = [(list(A), list(B), tries, '%s-%d' %(seed, i), strategy, beam_width, limits) for i in range(restarts)]
+        if workers == 1 or restarts == 1:
+            runs = [_simplify_worker(job) for job in jobs]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+            with ProcessPoolExecutor(max_workers = min(workers, restarts)) as executor:
+                runs = list(executor.map(_simplify_worker, jobs))
+    A,B,stats = min(runs, key = lambda run: (run[2].grid_number, run[2].grid_length))
     if verbose == True:
         print('Grid simplification from %s to %s' %(len(input_grid[0]), len(A)))
-    return([A,B])                
+    if return_stats == True:
+        return(_same_type(input_grid, [A,B]), [run[2] for run in runs])
+    return(_same_type(input_grid, [A,B]))
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1743,9 +3222,9 @@ def stabilisation(input_grid, row = 3, kind = 'XNE'):
             else:
                 Bstab.append(B[i])
     if Oflag == True:
-        return(invert_orientation([Astab, Bstab]))
+        return(_same_type(input_grid, invert_orientation([Astab, Bstab])))
     else:
-        return([Astab, Bstab])
+        return(_same_type(input_grid, [Astab, Bstab]))
     
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1832,8 +3311,64 @@ def uncoherent_bs(input_grid, where, which = 'rows'):
         table[where+1][0][0] = aux[0]
         table[where+1][0][1] = aux[2]        
     if which == 'columns' or which == 'c':
-        return(rotate(_from_table_to_grid(table),3))
-    return(_from_table_to_grid(table))
+        return(_same_type(input_grid, rotate(_from_table_to_grid(table),3)))
+    return(_same_type(input_grid, _from_table_to_grid(table)))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def undo_move(input_grid, record):
+    r"""
+    Restores a GridState modified by "apply_move" with "in_place" set to True, using
+    the record returned by "apply_move". Records must be undone in reverse order; 
+    this is the same as "GridState.undo" with a check on the record.
+
+    OUTPUT:
+
+    None, the input GridState is modified.
+
+    EXAMPLES::
+    
+    >> S = GridState([[0,1,2,3,4],[2,3,4,0,1]])
+    >> record = apply_move(S, Move('stabilisation', 3, 'XSW'), in_place = True)
+    >> undo_move(S, record)
+    >> S.grid()
+    [[0, 1, 2, 3, 4], [2, 3, 4, 0, 1]]
+
+    """
+    if not isinstance(input_grid, GridState):
+        raise Exception("In-place moves need a GridState")
+    if not input_grid.history or input_grid.history[-1] != record:
+        raise Exception("Records must be undone in reverse order")
+    input_grid.undo()
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def write_corpus(path, grids, max_grid_number = None):
+    r"""
+    Writes the given grids to a binary corpus file (see "GridCorpusWriter"), which can
+    be read with "GridCorpusReader". If "max_grid_number" is not given, the grids are
+    first collected in a list to find it; give it to stream the grids directly to the 
+    file instead.
+
+    OUTPUT:
+
+    The number of grids written.
+
+    EXAMPLES::
+
+    >> write_corpus('torus.grids', [generate_torus_link(2, k) for k in range(3, 30, 2)])
+    14
+    >> GridCorpusReader('torus.grids').grid_number(13)
+    31
+
+    """
+    if max_grid_number is None:
+        grids = list(grids)
+        max_grid_number = max([len(G[0]) for G in grids] + [2])
+    with GridCorpusWriter(path, max_grid_number) as writer:
+        for G in grids:
+            writer.write(G)
+    return len(writer)
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1856,21 +3391,7 @@ def writhe(input_grid):
     """
     if check_grid(input_grid) == 1:
         raise Exception("Invalid Input")    
-    A = input_grid[0]
-    B = input_grid[1]
-    writhe_aux = 0
-    n = len(A)
-    for i in range(1,n-1):
-        for j in range(min(A[i],B[i]),max(A[i],B[i])):
-            if A[i] < B[i] and B.index(j) < i < A.index(j):
-                writhe_aux -= 1
-            if A[i] < B[i] and A.index(j) < i < B.index(j):
-                writhe_aux += 1
-            if A[i] > B[i] and B.index(j) < i < A.index(j):
-                writhe_aux += 1
-            if A[i] > B[i] and A.index(j) < i < B.index(j):
-                writhe_aux -= 1
-    return writhe_aux
+    return _crossings_sweep(input_grid)[1]
 
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
@@ -1879,31 +3400,128 @@ def writhe(input_grid):
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def _apply_symmetry(input_list, inverse_list, transform):
+    #applies a symmetry of the square to one set of markings (given together with its
+    #inverse). The symmetry is a triple of booleans: first the rows and columns are
+    #exchanged, then the order of the rows is reversed, and finally that of the columns
+    swap, flip_rows, flip_columns = transform
+    n = len(input_list)
+    out_list = inverse_list if swap else input_list
+    if flip_rows:
+        out_list = out_list[::-1]
+    if flip_columns:
+        out_list = [n-1-a for a in out_list]
+    elif out_list is input_list or out_list is inverse_list:
+        out_list = list(out_list)
+    return out_list
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def _aux_braid(input_grid):    
+    #the vertical segment in column c is seen as a strand going up from the X marking
+    #to the O marking, passing through the top of the grid if needed. The rows are 
+    #swept upwards, keeping in a Fenwick tree the columns of the strands crossing the
+    #current row: the horizontal segment crosses those between its markings, and the
+    #generators are shifted by the number of strands on its left
     A = input_grid[0]
     B = input_grid[1]
+    n = len(A)
+    Ainv, Binv = _inverses(input_grid)
+    tree = [0]*(n+1)
+    for c in range(n):
+        if Ainv[c] > Binv[c]:
+            _fenwick_add(tree, c, 1)
     braid_gens = []
-    for l in range(len(A)):
+    for l in range(n):
+        _fenwick_add(tree, B[l], -1)
+        low = min(A[l], B[l])
+        left = _fenwick_sum(tree, low)
+        aux = _fenwick_sum(tree, max(A[l], B[l])) - _fenwick_sum(tree, low+1)
         if A[l] < B[l]:
-            aux = _count_crossings_braid([A,B],l)
-            if aux != 0:
-                gens = []
-                temp = []
-                for s in range(aux):
-                    temp.append(s+1+_strandsontheleft([A,B],l))
-                gens = gens + temp[::-1]
-                braid_gens = braid_gens + gens
-        if A[l] > B[l]:
-            aux = _count_crossings_braid([A,B],l)
-            if aux > 0:
-                gens = []
-                for s in range(aux):
-                    gens.append(-(s+1+_strandsontheleft([A,B],l)))
-                braid_gens = braid_gens + gens
+            braid_gens += range(left+aux, left, -1)
+        else:
+            braid_gens += range(-left-1, -left-aux-1, -1)
+        _fenwick_add(tree, A[l], 1)
     return braid_gens
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
+def _batch_descending_cusps(A, B, Ainv, Binv):
+    #vectorized version of descending_cusps on (k,n) arrays
+    import numpy as np
+    rows = np.arange(A.shape[1])
+    upwards = A < B
+    first = upwards & (np.take_along_axis(Binv, A, axis = 1) < rows)
+    second = upwards & (np.take_along_axis(Ainv, B, axis = 1) > rows)
+    return (first.sum(axis = 1) + second.sum(axis = 1)).astype(np.int64)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _batch_number_of_components(B, Ainv):
+    #counts the cycles of the permutations j -> B[Ainv[j]] by pointer doubling: after
+    #the last step, each element is labelled by the minimum of its cycle
+    import numpy as np
+    k, n = B.shape
+    perm = np.take_along_axis(B, Ainv, axis = 1)
+    labels = np.broadcast_to(np.arange(n), (k, n)).copy()
+    steps = 1
+    while steps < n:
+        labels = np.minimum(labels, np.take_along_axis(labels, perm, axis = 1))
+        perm = np.take_along_axis(perm, perm, axis = 1)
+        steps *= 2
+    return (labels == np.arange(n)).sum(axis = 1).astype(np.int64)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _batch_setup(input_grids):
+    #converts the input into (k,n) arrays of X and O markings and their inverses,
+    #checking that each slice is a valid grid
+    import numpy as np
+    try:
+        grids = np.asarray(input_grids, dtype = np.int64)
+    except ValueError:
+        raise Exception("Invalid Input")
+    if grids.ndim != 3 or grids.shape[1] != 2 or grids.shape[2] < 2:
+        raise Exception("Invalid Input")
+    k, n = grids.shape[0], grids.shape[2]
+    A = np.ascontiguousarray(grids[:,0,:])
+    B = np.ascontiguousarray(grids[:,1,:])
+    identity = np.arange(n)
+    if (np.sort(A, axis = 1) != identity).any() or (np.sort(B, axis = 1) != identity).any() or (A == B).any():
+        raise Exception("Invalid Input")
+    rows = np.broadcast_to(identity, (k, n))
+    Ainv = np.empty_like(A)
+    Binv = np.empty_like(B)
+    np.put_along_axis(Ainv, A, rows, axis = 1)
+    np.put_along_axis(Binv, B, rows, axis = 1)
+    return A, B, Ainv, Binv
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _batch_writhe(A, B, Ainv, Binv):
+    #vectorized version of writhe. For each grid, row i and column j give a crossing
+    #if j is strictly between the markings of the row and i strictly between the
+    #markings of the column; the (k,n,n) array of crossings is built in chunks
+    import numpy as np
+    k, n = A.shape
+    out = np.zeros(k, dtype = np.int64)
+    columns = np.arange(n)
+    chunk = max(1, 2**22 // (n*n))
+    for start in range(0, k, chunk):
+        sl = slice(start, start + chunk)
+        row_low = np.minimum(A[sl], B[sl])[:,:,None]
+        row_high = np.maximum(A[sl], B[sl])[:,:,None]
+        col_low = np.minimum(Ainv[sl], Binv[sl])[:,None,:]
+        col_high = np.maximum(Ainv[sl], Binv[sl])[:,None,:]
+        crossings = (row_low < columns[None,None,:]) & (columns[None,None,:] < row_high)
+        crossings &= (col_low < columns[None,:,None]) & (columns[None,:,None] < col_high)
+        row_signs = np.where(A[sl] < B[sl], 1, -1)
+        column_signs = np.where(Ainv[sl] < Binv[sl], 1, -1)
+        out[sl] = np.einsum('kij,ki,kj->k', crossings.astype(np.int64), row_signs, column_signs)
+    return out
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
 def _check_rows(input_grid, where):
     #gives True if the commutation is NOT interleaving
     A = input_grid[0]
@@ -1920,54 +3538,449 @@ def _check_rows(input_grid, where):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _check_distance_one(input_grid):
+def _simplify_run(A, B, tries, random_index, stats):
+    #a single run of simplify_grid, drawing its random numbers from random_index
+    #(which behaves like randrange). Returns the grid, and records the moves in stats
+    count = 0
+    #the commutable rows/columns and the destabilization sites are kept up to date
+    #after each move, instead of being searched again from scratch
+    candidates = _SimplificationCandidates(A, B)
+    stats._record(candidates.n)
+    while count < tries and candidates.n>3:
+        if candidates.destabilization_sites > 0:
+            AA,BB = destabilize_all([candidates.A,candidates.B])
+            if len(AA) != candidates.n:
+                candidates.reset(AA, BB)
+                stats._record(candidates.n)
+        if stats._stop(candidates.n):
+            break
+        n = candidates.n
+        dice = random_index(0,3)
+        stats.moves += 1
+        if dice == 0:
+            candidates.reset(*cyclic_shift([candidates.A,candidates.B], random_index(0,n+1), random_index(0,n+1)))
+            count += 1
+        elif dice ==1:
+            iterator = candidates.commutable_rows.find(1)
+            if iterator != -1:
+                candidates.commute_rows(iterator)
+                count += 1
+        elif dice ==2:
+            iterator = candidates.commutable_columns.find(1)
+            if iterator != -1:
+                candidates.commute_columns(iterator)
+                count += 1
+    stats.accepted = count
+    return candidates.A, candidates.B
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _simplify_worker(job):
+    #one independently seeded run of simplify_grid; it is a top level function so
+    #that it can be sent to the processes of a ProcessPoolExecutor
+    A, B, tries, seed, strategy, beam_width, limits = job
+    generator = Random(seed)
+    stats = SimplifyStats(seed, strategy, *limits)
+    A, B = _simplify_strategy(A, B, tries, generator.randrange, generator.random, strategy, beam_width, stats)
+    return (A, B, stats)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _simplify_strategy(A, B, tries, random_index, random_float, strategy, beam_width, stats):
+    #a single run of simplify_grid with the given strategy; random_float behaves like
+    #random.random. Returns the grid, and completes the statistics of the run
+    if strategy == 'random':
+        A, B = _simplify_run(A, B, tries, random_index, stats)
+    elif strategy == 'anneal':
+        A, B = _anneal_run(A, B, tries, random_index, random_float, stats)
+    else:
+        A, B = _beam_run(A, B, tries, random_index, beam_width, stats)
+    stats._finish(A, B)
+    return A, B
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _anneal_run(A, B, tries, random_index, random_float, stats):
+    #simulated annealing on the length of the grid. A move increasing the length by d
+    #is accepted with probability exp(-d/T), where the temperature T decreases 
+    #geometrically from 2 to 1/20 as the moves (or the time) run out. Destabilizations
+    #are always performed, as soon as they are available
+    candidates = _SimplificationCandidates(A, B)
+    energy = grid_length([candidates.A, candidates.B])
+    stats._record(candidates.n)
+    while stats.moves < tries and candidates.n > 3:
+        if candidates.destabilization_sites > 0:
+            AA,BB = destabilize_all([candidates.A,candidates.B])
+            if len(AA) != candidates.n:
+                candidates.reset(AA, BB)
+                energy = grid_length([AA, BB])
+                stats._record(candidates.n)
+                continue
+        if stats._stop(candidates.n):
+            break
+        temperature = 2.0*0.025**stats._progress(tries)
+        n = candidates.n
+        dice = random_index(0,4)
+        stats.moves += 1
+        if dice == 0:
+            old_grid = [candidates.A, candidates.B]
+            candidates.reset(*cyclic_shift(old_grid, random_index(1,n), random_index(1,n)))
+            new_energy = grid_length([candidates.A, candidates.B])
+            if _accept_move(new_energy - energy, temperature, random_float):
+                energy = new_energy
+                stats.accepted += 1
+            else:
+                candidates.reset(*old_grid)
+            continue
+        #commutations of rows and of columns are equally likely, and the pair is drawn
+        #uniformly among the commutable ones (by rejection, after checking that there
+        #is at least one)
+        rows = random_index(0,2) == 0
+        commutable = candidates.commutable_rows if rows else candidates.commutable_columns
+        if commutable.find(1) == -1:
+            continue
+        where = random_index(0,n-1)
+        while not commutable[where]:
+            where = random_index(0,n-1)
+        if rows:
+            P, Q, commute = candidates.Ainv, candidates.Binv, candidates.commute_rows
+            affected = (candidates.A[where], candidates.A[where+1], candidates.B[where], candidates.B[where+1])
+        else:
+            P, Q, commute = candidates.A, candidates.B, candidates.commute_columns
+            affected = (candidates.Ainv[where], candidates.Ainv[where+1], candidates.Binv[where], candidates.Binv[where+1])
+        #only the segments crossing the two rows (columns) change their length
+        before = sum([abs(P[i] - Q[i]) for i in affected])
+        commute(where)
+        change = sum([abs(P[i] - Q[i]) for i in affected]) - before
+        if _accept_move(change, temperature, random_float):
+            energy += change
+            stats.accepted += 1
+        else:
+            commute(where)
+    A, B = destabilize_all([candidates.A, candidates.B])
+    stats._record(len(A))
+    return A, B
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _accept_move(change, temperature, random_float):
+    #the Metropolis rule
+    return change <= 0 or random_float() < _exp(-change/temperature)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _beam_run(A, B, tries, random_index, beam_width, stats):
+    #beam search: at each step six random non-interleaving commutations and a random
+    #cyclic shift of each grid in the beam are performed, followed by all the 
+    #possible destabilizations, and the best beam_width new grids (by grid number and
+    #length, with random ties) form the next beam. Grids already seen are discarded,
+    #so that the search keeps moving when no move improves the grid
+    best = destabilize_all([A, B])
+    beam = [best]
+    seen = set([tuple(best[0] + best[1])])
+    stats._record(len(best[0]))
+    while stats.moves < tries and len(best[0]) > 3:
+        if stats._stop(len(best[0])):
+            break
+        children = []
+        for G in beam:
+            n = len(G[0])
+            row_codes, column_codes = commutation_sites(G)
+            rows = [i for i in range(n-1) if row_codes[i] == 'N']
+            columns = [i for i in range(n-1) if column_codes[i] == 'N']
+            moves = [(cyclic_shift, (random_index(1,n), random_index(1,n)))]
+            for i in range(3):
+                if rows:
+                    moves.append((commute_rows, (rows[random_index(0,len(rows))], 'N')))
+                if columns:
+                    moves.append((commute_columns, (columns[random_index(0,len(columns))], 'N')))
+            for move, parameters in moves:
+                H = destabilize_all(move(G, *parameters))
+                stats.moves += 1
+                key = tuple(H[0] + H[1])
+                if key not in seen:
+                    seen.add(key)
+                    children.append((len(H[0]), grid_length(H), random_index(0,2**30), H))
+        children.sort(key = lambda child: child[:3])
+        beam = [child[3] for child in children[:beam_width]]
+        stats.accepted += len(beam)
+        if not beam:
+            stats.stopped = 'exhausted'
+        elif len(beam[0][0]) < len(best[0]):
+            best = beam[0]
+            stats._record(len(best[0]))
+    return best[0], best[1]
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _knot_index():
+    #the dictionary from the canonical encodings (see _canonical_encoding) of the 
+    #catalog grids, their mirror images and their orientation reversals, to the names
+    #of the knots. Built on the first call, so that importing the module stays fast
+    if not _KNOT_INDEX:
+        catalog = [(name, G) for name, G in _KNOTS.items()]
+        catalog += [(name, G) for name, grids in _LEGENDRIAN_KNOTS.items() for G in grids]
+        for name, G in catalog:
+            if name.startswith('m('):
+                mirror_name = name[2:-1]
+            elif name in _AMPHICHIRAL_KNOTS:
+                mirror_name = name
+            else:
+                mirror_name = 'm(%s)' %name
+            for H, H_name in ((G, name), (mirror_grid(G), mirror_name)):
+                for K in (H, invert_orientation(H)):
+                    _KNOT_INDEX.setdefault(tuple(_canonical_encoding(K, 'isotopy')), H_name)
+    return _KNOT_INDEX
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _grid_necklaces(n, part = 0, parts = 1):
+    #the least rotations of the row encodings of the grids of size n (see 
+    #_canonical_encoding), generated as necklaces with the algorithm of Fredricksen, 
+    #Kessler and Maiorana. The prefix a[1..t] is extended only if the markings it
+    #determines are in distinct columns; A[i] is the column of the X marking of row 
+    #i-1, and the last row must bring it back to 0. Only the prefixes of length 2 
+    #whose index is congruent to part modulo parts are explored
+    a = [0]*(n+1)
+    A = [0]*(n+1)
+    used_A = [False]*n
+    used_B = [False]*n
+    used_A[0] = True
+    prefixes = [0]
+
+    def extend(t, p):
+        if t == 3:
+            prefixes[0] += 1
+            if (prefixes[0] - 1) % parts != part:
+                return
+        if t > n:
+            if n % p == 0:
+                yield a[1:]
+            return
+        for c in range(a[t-p], n*n):
+            dA, dB = divmod(c, n)
+            new_A = (A[t-1] + dA) % n
+            new_B = (A[t-1] + dB) % n
+            if dB == 0 or used_B[new_B] or (new_A != 0 if t == n else used_A[new_A]):
+                continue
+            a[t] = c
+            A[t] = new_A
+            used_A[new_A] = True
+            used_B[new_B] = True
+            for code in extend(t+1, p if c == a[t-p] else t):
+                yield code
+            used_A[new_A] = t == n
+            used_B[new_B] = False
+
+    return extend(1, 1)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _canonical_encoding(input_grid, symmetries):
+    #the least rotation of the row encoding among all the images of the grid 
+    #under the symmetry group; each row is a single integer dA*n + dB
+    return min(_symmetric_encodings(input_grid, symmetries))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _symmetric_encodings(input_grid, symmetries):
+    #the least rotations of the row encodings of the images of the grid under the 
+    #symmetry group, one at a time (so that a search for a smaller one can stop early)
     A = input_grid[0]
     B = input_grid[1]
-    counter = 0
-    indici = []
-    for i in range(len(A)-1):
-        if A[i] == B[i+1] :
-            counter += 1
-            indici.append(i)
-    return(indici)
+    n = len(A)
+    Ainv, Binv = _inverses(input_grid)
+    for transform, swap_markings in _SYMMETRY_GROUPS[symmetries]:
+        AA = _apply_symmetry(A, Ainv, transform)
+        BB = _apply_symmetry(B, Binv, transform)
+        if swap_markings:
+            AA, BB = BB, AA
+        code = [((AA[(i+1) % n] - AA[i]) % n)*n + (BB[i] - AA[i]) % n for i in range(n)]
+        k = _least_rotation(code)
+        yield code[k:] + code[:k]
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _least_rotation(input_list):
+    #Booth's algorithm: the starting index of the lexicographically least rotation
+    S = input_list + input_list
+    f = [-1]*len(S)
+    k = 0
+    for j in range(1, len(S)):
+        sj = S[j]
+        i = f[j-k-1]
+        while i != -1 and sj != S[k+i+1]:
+            if sj < S[k+i+1]:
+                k = j-i-1
+            i = f[i]
+        if sj != S[k+i+1]:
+            #here i == -1
+            if sj < S[k]:
+                k = j
+            f[j-k] = -1
+        else:
+            f[j-k] = i+1
+    return k
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 def _check_columns(input_grid,where):
-    return(_check_rows(rotate(input_grid,1),where))
+    #the rotated grid and the one formed by the inverse permutations only differ 
+    #by a reflection, which does not change the outcome of _check_rows
+    return(_check_rows(_inverses(input_grid),where))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _compose_symmetries(second, first):
+    #the symmetry of the square obtained by applying "first" and then "second"
+    swap1, rows1, columns1 = first
+    swap2, rows2, columns2 = second
+    if swap2:
+        return (swap1 != swap2, rows2 != columns1, columns2 != rows1)
+    return (swap1, rows2 != rows1, columns2 != columns1)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _commutation_codes(A, B):
+    #the codes of "commutation_sites" for the pairs of adjacent rows of [A,B]; the 
+    #same tests as _check_rows, in a single pass
+    low = [a if a < b else b for a, b in zip(A, B)]
+    high = [b if a < b else a for a, b in zip(A, B)]
+    codes = []
+    for i in range(len(A)-1):
+        if A[i] == B[i+1] or B[i] == A[i+1]:
+            codes.append('B')
+        elif low[i] < low[i+1] < high[i] < high[i+1] or low[i+1] < low[i] < high[i+1] < high[i]:
+            codes.append('Y')
+        else:
+            codes.append('N')
+    return ''.join(codes)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _compose_permutations(first, second):
+    #the permutation i -> second[first[i]], i.e. first is applied first
+    return [second[i] for i in first]
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _count_cycles(input_list, fixed_points = True):
+    #number of cycles of a permutation, optionally not counting the fixed points
+    n = len(input_list)
+    visited = bytearray(n)
+    cycles = 0
+    for i in range(n):
+        if not visited[i]:
+            if input_list[i] != i or fixed_points:
+                cycles += 1
+            j = i
+            while not visited[j]:
+                visited[j] = 1
+                j = input_list[j]
+    return cycles
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _count_crossings_braid(input_grid,segment, writhe = 'True'):  
-    ##if writhe == True also keeps track
-    #of the signs of the crossings
+def _crossings_sweep(input_grid):
+    #gives the number of crossings and the writhe of the grid. The rows are swept 
+    #from the bottom, keeping in two Fenwick trees the columns whose vertical segment
+    #is crossed by the current row (with weight +1, and with the sign of the
+    #vertical segment, which is +1 if the X is below the O and -1 otherwise).
     A = input_grid[0]
     B = input_grid[1]
-    crossings_braid = 0
-    if abs(A[segment] - B[segment]) == 1:
-        return 0
-    elif A[segment]<B[segment]:
-        for t in range(len(A)):
-            if t != segment:
-                if A[segment] < A[t] < B[segment]:
-                    if t<segment:
-                        if B.index(A[t]) > segment or B.index(A[t]) < t:
-                            crossings_braid += 1
-                    if t>segment:
-                        if segment < B.index(A[t]) < t:
-                            crossings_braid += 1
-    elif B[segment]<A[segment]:
-        for t in range(len(A)):
-            if t != segment:
-                if B[segment] < A[t] < A[segment]:
-                    if t<segment:
-                        if B.index(A[t]) > segment or B.index(A[t]) < t:
-                            crossings_braid += 1
-                    if t>segment:
-                        if segment < B.index(A[t]) < t:
-                            crossings_braid += 1
-    return crossings_braid
-    
+    Ainv, Binv = _inverses(input_grid)
+    n = len(A)
+    open_columns = (n+1)*[0]
+    signed_columns = (n+1)*[0]
+    crossings_aux = 0
+    writhe_aux = 0
+    for i in range(n):
+        for j in (A[i], B[i]):
+            if max(Ainv[j], Binv[j]) == i:
+                _fenwick_add(open_columns, j, -1)
+                _fenwick_add(signed_columns, j, 1 if Binv[j] < Ainv[j] else -1)
+        low = min(A[i],B[i])
+        high = max(A[i],B[i])
+        if high - low > 1:
+            crossings_aux += _fenwick_sum(open_columns, high) - _fenwick_sum(open_columns, low+1)
+            if A[i] < B[i]:
+                writhe_aux += _fenwick_sum(signed_columns, high) - _fenwick_sum(signed_columns, low+1)
+            else:
+                writhe_aux -= _fenwick_sum(signed_columns, high) - _fenwick_sum(signed_columns, low+1)
+        for j in (A[i], B[i]):
+            if min(Ainv[j], Binv[j]) == i:
+                _fenwick_add(open_columns, j, 1)
+                _fenwick_add(signed_columns, j, -1 if Binv[j] < Ainv[j] else 1)
+    return crossings_aux, writhe_aux
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _crossings_lists(input_grid):
+    #for each row, the columns of the vertical segments crossing its horizontal segment,
+    #and for each column the rows of the horizontal segments crossing it, all in 
+    #increasing order. The rows are swept upwards, keeping the sorted list of the 
+    #columns whose vertical segment contains the current row in its interior
+    A = input_grid[0]
+    B = input_grid[1]
+    n = len(A)
+    Ainv, Binv = _inverses(input_grid)
+    opening = [[] for r in range(n)]
+    closing = [[] for r in range(n)]
+    for k in range(n):
+        opening[min(Ainv[k], Binv[k])].append(k)
+        closing[max(Ainv[k], Binv[k])].append(k)
+    row_crossings = []
+    column_crossings = [[] for k in range(n)]
+    active = []
+    for r in range(n):
+        for k in closing[r]:
+            del active[bisect_left(active, k)]
+        crossings = active[bisect_right(active, min(A[r], B[r])):bisect_left(active, max(A[r], B[r]))]
+        row_crossings.append(crossings)
+        for k in crossings:
+            column_crossings[k].append(r)
+        for k in opening[r]:
+            insort(active, k)
+    return row_crossings, column_crossings
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _freely_reduce_braid(word):
+    #cancels the pairs g, -g separated only by generators commuting with g (i.e. whose 
+    #index differs by at least 2), and moves each generator to the left of the commuting
+    #ones with a larger index just before it
+    out = []
+    for g in word:
+        j = len(out) - 1
+        while j >= 0 and abs(abs(out[j]) - abs(g)) >= 2:
+            j -= 1
+        if j >= 0 and out[j] == -g:
+            del out[j]
+            continue
+        k = len(out)
+        while k > j+1 and abs(out[k-1]) > abs(g):
+            k -= 1
+        out.insert(k, g)
+    return out
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _cyclically_reduce_braid(word):
+    #removes the first generator together with an inverse one which can be moved to 
+    #the end of the word (the closure is invariant under conjugation)
+    word = list(word)
+    while len(word) > 1:
+        g = word[0]
+        j = len(word) - 1
+        while j > 0 and word[j] != -g and abs(abs(word[j]) - abs(g)) >= 2:
+            j -= 1
+        if j > 0 and word[j] == -g:
+            del word[j]
+            del word[0]
+        else:
+            break
+    return word
+
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
 def _distance_markings(A,B,J):
@@ -1980,39 +3993,31 @@ def _distance_markings(A,B,J):
 def _howmanystrands(input_grid):
     A = input_grid[0]
     B = input_grid[1]
+    Ainv, Binv = _inverses(input_grid)
     counter = 0
     for q in range(len(A)):
-        if A.index(q) > B.index(q):
+        if Ainv[q] > Binv[q]:
             counter = counter+1
     return counter
     
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _strandsontheleft(input_grid,segment):
-    A = input_grid[0]
-    B = input_grid[1]
-    strands = 0
-    if A[segment]<B[segment]:
-        for t in range(len(A)):
-            if t != segment:
-                if A[t] < A[segment]:
-                    if t<segment:
-                        if B.index(A[t]) > segment or B.index(A[t]) < t:
-                            strands += 1
-                    if t>segment:
-                        if segment < B.index(A[t]) < t:
-                            strands += 1
-    if A[segment]>B[segment]:
-        for t in range(len(A)):
-            if t != segment:
-                if A[t] < B[segment]:
-                    if t<segment:
-                        if B.index(A[t]) > segment or B.index(A[t]) < t:
-                            strands += 1
-                    if t>segment:
-                        if segment < B.index(A[t]) < t:
-                            strands += 1
-    return strands
+def _fenwick_add(tree, index, value):
+    #adds value at position index of a Fenwick (binary indexed) tree
+    index += 1
+    while index < len(tree):
+        tree[index] += value
+        index += index & (-index)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _fenwick_sum(tree, index):
+    #sum of the values at the positions 0,...,index-1 of a Fenwick tree
+    total = 0
+    while index > 0:
+        total += tree[index]
+        index -= index & (-index)
+    return total
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -2086,8 +4091,35 @@ def _check_rows_for_bands(input_grid, where):
             
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _invert(M):
-    return M[1],M[0]
+def _destabilization_rows(A, B):
+    #the rows of [A,B] accepted by destabilize: the two markings are in adjacent 
+    #columns, and one of them shares its column with a marking of a neighbouring row
+    n = len(A)
+    rows = []
+    for where in range(n):
+        a, b = A[where], B[where]
+        if a - b != 1 and b - a != 1:
+            continue
+        if where < n-1 and (a == B[where+1] or b == A[where+1]):
+            rows.append(where)
+        elif where > 0 and (a == B[where-1] or b == A[where-1]):
+            rows.append(where)
+    return rows
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _destabilizable(input_grid):
+    #whether destabilize_all shrinks the grid after some cyclic shift: two rows (or 
+    #columns) which are adjacent on the torus have markings in the same column, and 
+    #they do not form a 2x2 component. This is the test of destabilize_all, with the 
+    #pairs across the border added
+    n = len(input_grid[0])
+    for A, B in [input_grid, _inverses(input_grid)]:
+        for i in range(n):
+            k = (i+1) % n
+            if (A[i] == B[k]) != (B[i] == A[k]):
+                return True
+    return False
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -2136,18 +4168,277 @@ def _destabilize_aux(input_grid,where):
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
-def _can_simplify(input_grid):
+class _SimplificationCandidates(object):
+    #keeps a grid together with the inverse permutations of its markings, the 
+    #(non-interleaving) commutable pairs of rows and columns, and the number of 
+    #pairs of adjacent rows/columns which are sites for a (generalized) 
+    #destabilization. After a commutation only the neighbouring pairs are checked 
+    #again, while after a cyclic shift or a destabilization everything is recomputed.
+    __slots__ = ('A', 'B', 'Ainv', 'Binv', 'n', 'commutable_rows', 'commutable_columns', 'row_sites', 'column_sites', 'destabilization_sites')
+
+    def __init__(self, A, B):
+        self.reset(A, B)
+
+    def reset(self, A, B):
+        self.A = list(A)
+        self.B = list(B)
+        self.Ainv = _inverse_permutation(A)
+        self.Binv = _inverse_permutation(B)
+        self.n = len(A)
+        #a blocked pair of rows (columns) is a destabilization site
+        row_codes = _commutation_codes(self.A, self.B)
+        column_codes = _commutation_codes(self.Ainv, self.Binv)
+        self.commutable_rows = bytearray([code == 'N' for code in row_codes] + [0])
+        self.commutable_columns = bytearray([code == 'N' for code in column_codes] + [0])
+        self.row_sites = bytearray([code == 'B' for code in row_codes] + [0])
+        self.column_sites = bytearray([code == 'B' for code in column_codes] + [0])
+        self.destabilization_sites = sum(self.row_sites) + sum(self.column_sites)
+
+    def _update_row_pair(self, where):
+        if 0 <= where < self.n-1:
+            A, B = self.A, self.B
+            self.commutable_rows[where] = _check_rows([A,B], where) is True
+            site = A[where] == B[where+1] or B[where] == A[where+1]
+            self.destabilization_sites += site - self.row_sites[where]
+            self.row_sites[where] = site
+
+    def _update_column_pair(self, where):
+        if 0 <= where < self.n-1:
+            Ainv, Binv = self.Ainv, self.Binv
+            self.commutable_columns[where] = _check_rows([Ainv,Binv], where) is True
+            site = Ainv[where] == Binv[where+1] or Binv[where] == Ainv[where+1]
+            self.destabilization_sites += site - self.column_sites[where]
+            self.column_sites[where] = site
+
+    def commute_rows(self, where):
+        A, B, Ainv, Binv = self.A, self.B, self.Ainv, self.Binv
+        A[where], A[where+1] = A[where+1], A[where]
+        B[where], B[where+1] = B[where+1], B[where]
+        Ainv[A[where]], Ainv[A[where+1]] = where, where+1
+        Binv[B[where]], Binv[B[where+1]] = where, where+1
+        for ii in (where-1, where, where+1):
+            self._update_row_pair(ii)
+        for column in (A[where], A[where+1], B[where], B[where+1]):
+            self._update_column_pair(column-1)
+            self._update_column_pair(column)
+
+    def commute_columns(self, where):
+        A, B, Ainv, Binv = self.A, self.B, self.Ainv, self.Binv
+        Ainv[where], Ainv[where+1] = Ainv[where+1], Ainv[where]
+        Binv[where], Binv[where+1] = Binv[where+1], Binv[where]
+        A[Ainv[where]], A[Ainv[where+1]] = where, where+1
+        B[Binv[where]], B[Binv[where+1]] = where, where+1
+        for ii in (where-1, where, where+1):
+            self._update_column_pair(ii)
+        for row in (Ainv[where], Ainv[where+1], Binv[where], Binv[where+1]):
+            self._update_row_pair(row-1)
+            self._update_row_pair(row)
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _move_candidates(input_grid):
+    #the moves which can be performed on the grid, in the order of perform_all_moves.
+    #The destabilizations are those listed by destabilization_sites
     A = input_grid[0]
     B = input_grid[1]
-    cc = _check_distance_one([A, B])
-    ccr = _check_distance_one(rotate([A,B],1))
-    cci = _check_distance_one(_invert([A,B]))
-    ccir = _check_distance_one(_invert(rotate([A,B],1)))
-   
-    if len(cc) > 0 or len(ccr) >0 or len(cci) > 0 or len(ccir) >0:
-        return True
-    else:
-        return False
+    Ainv, Binv = _inverses(input_grid)
+    nn = len(A)
+    for i in range(nn):
+        for kind in ['XNE','XNW','XSE','XSW','ONE','ONW','OSE','OSW']:
+            yield Move('stabilisation', i, kind)
+    for i in range(nn-1):
+        if _check_rows([Ainv, Binv], i) == True:
+            yield Move('commutation', i, 'columns')
+        if _check_rows(input_grid, i) == True:
+            yield Move('commutation', i, 'rows')
+    if nn == 2:
+        return
+    rows = set(_destabilization_rows(A, B))
+    columns = set(_destabilization_rows(Ainv, Binv))
+    for i in range(nn):
+        if i in rows:
+            yield Move('destabilization', i, 'row')
+        if i in columns:
+            yield Move('destabilization', i, 'col')
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _insert_grid_row(lists, where, markings, column, neighbour, which):
+    #inserts in the pair of arrays (or lists) a row with the given markings at index
+    #where, and an empty column at index column; then the marking of lists[which] in 
+    #row neighbour is moved to the new column. Returns its previous column, so that
+    #_remove_grid_row(lists, where, column, neighbour, which, value) takes this back
+    for P in lists:
+        for i in range(len(P)):
+            if P[i] >= column:
+                P[i] += 1
+    lists[0].insert(where, markings[0])
+    lists[1].insert(where, markings[1])
+    value = lists[which][neighbour]
+    lists[which][neighbour] = column
+    return value
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _remove_grid_row(lists, where, column, neighbour, which, value):
+    #inverse of _insert_grid_row: moves the marking of lists[which] in row neighbour
+    #to the given value, and removes the row where and the column column. Returns the 
+    #markings of the removed row
+    lists[which][neighbour] = value
+    markings = [lists[0].pop(where), lists[1].pop(where)]
+    for P in lists:
+        for i in range(len(P)):
+            if P[i] > column:
+                P[i] -= 1
+    return markings
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _inverse_permutation(input_list):
+    #inverse of a permutation of range(n), in linear time
+    out_list = len(input_list)*[0]
+    for i in range(len(input_list)):
+        out_list[input_list[i]] = i
+    return out_list
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _inverses(input_grid):
+    #gives the inverse permutations of the X and O markings; these are cached
+    #when the input is a Grid, and computed in linear time otherwise
+    if isinstance(input_grid, Grid):
+        input_grid._materialize()
+        return input_grid._inverses
+    return (_inverse_permutation(input_grid[0]), _inverse_permutation(input_grid[1]))
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+class _RandomGrids(object):
+    #the iterator returned by iter_random_grids. The method _fill draws the same grids
+    #as __next__, but writes them directly into the rows of a NumPy array: the X
+    #markings are shuffled in a reused list, and the O markings are taken from them 
+    #with numpy.take. Only the derangement is built for each grid
+    __slots__ = ('grid_size', 'count', 'produced', 'components', '_generator', '_counts')
+
+    def __init__(self, grid_size, count, generator, components):
+        self.grid_size = grid_size
+        self.count = count
+        self.produced = 0
+        self.components = components
+        self._generator = generator
+        self._counts = _derangement_counts(grid_size, components)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.count is not None and self.produced >= self.count:
+            raise StopIteration
+        A = _random_permutation(self.grid_size, self._generator.shuffle)
+        derangement = _random_derangement(self.grid_size, self.components, self._counts, self._generator.randrange)
+        self.produced += 1
+        return [A, [A[i] for i in derangement]]
+
+    def _fill(self, output_array):
+        import numpy as np
+        n = self.grid_size
+        batch = len(output_array)
+        if self.count is not None:
+            batch = max(min(batch, self.count - self.produced), 0)
+        identity = list(range(n))
+        A = list(identity)
+        for filled in range(batch):
+            A[:] = identity
+            self._generator.shuffle(A)
+            derangement = _random_derangement(n, self.components, self._counts, self._generator.randrange)
+            output_array[filled, 0] = A
+            np.take(output_array[filled, 0], derangement, out = output_array[filled, 1])
+        self.produced += batch
+        return batch
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _derangement_counts(n, cycles = 0):
+    #counts[m][k] is the number D(m,k) of permutations of range(m) without fixed points
+    #and with k cycles (if cycles is 0, counts[m][0] is the number of all of them).
+    #These satisfy D(m,k) = (m-1)*(D(m-1,k) + D(m-2,k-1)): the element m-1 is either 
+    #inserted after another element in a cycle of a smaller derangement, or forms a
+    #2-cycle with another element
+    counts = [[1] + [0]*cycles, [0]*(cycles+1)]
+    for m in range(2, n+1):
+        if cycles > 0:
+            counts.append([(m-1)*counts[m-1][0]] + [(m-1)*(counts[m-1][k] + counts[m-2][k-1]) for k in range(1, cycles+1)])
+        else:
+            counts.append([(m-1)*(counts[m-1][0] + counts[m-2][0])])
+    return counts
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _random_derangement(n, cycles = 0, counts = None, random_index = randrange):
+    #a uniformly random derangement of range(n) with the given number of cycles (any
+    #number if cycles is 0), following the recursion of _derangement_counts backwards.
+    #A single random number chooses both the case and the other element
+    if counts is None:
+        counts = _derangement_counts(n, cycles)
+    track = cycles > 0
+    k = cycles if track else 0
+    steps = []
+    m = n
+    while m > 0:
+        r = random_index(counts[m][k])
+        inserted = (m-1)*counts[m-1][k]
+        if r < inserted:
+            steps.append((m, r//counts[m-1][k], True))
+            m -= 1
+        else:
+            smaller = counts[m-2][k-1] if track else counts[m-2][0]
+            steps.append((m, (r - inserted)//smaller, False))
+            m -= 2
+            if track:
+                k -= 1
+    perm = []
+    inv = []
+    for m, j, inserted in reversed(steps):
+        if inserted:
+            #m-1 goes between j and its image
+            image = perm[j]
+            perm.append(image)
+            inv.append(j)
+            perm[j] = m-1
+            inv[image] = m-1
+        else:
+            #j is renamed m-2, then j and m-1 form a 2-cycle
+            perm += [0, 0]
+            inv += [0, 0]
+            if j != m-2:
+                image = perm[j]
+                preimage = inv[j]
+                perm[m-2] = image
+                inv[image] = m-2
+                perm[preimage] = m-2
+                inv[m-2] = preimage
+            perm[j] = m-1
+            inv[m-1] = j
+            perm[m-1] = j
+            inv[j] = m-1
+    return perm
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _random_permutation(n, random_shuffle = shuffle):
+    #a uniformly random permutation of range(n), drawn by default with the global 
+    #random generator
+    output_list = list(range(n))
+    random_shuffle(output_list)
+    return output_list
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def _same_type(input_grid, output_grid):
+    #moves performed on a Grid give a Grid back (failed moves still return 0)
+    if isinstance(input_grid, Grid) and output_grid != 0:
+        return Grid(output_grid)
+    return output_grid
 
 #+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
 
@@ -1,6 +1,9 @@
 import GridPythonModule 
 from GridPythonModule import *
+import json
 import pytest
+import subprocess
+import sys
 
 test_grid = [[0,1,2,3,4],[2,3,4,0,1]]
 no_grid   = [0,1,2,3,4],[2,3,4,0,0]
@@ -21,6 +24,82 @@ def test_check_grid():
 ######################################################################################################################
 
 
+def test_Grid():
+
+    G = Grid(test_link)
+
+    assert G == test_link and len(G) == 2
+
+    assert G.X_inverse == [2, 5, 0, 3, 1, 4] and G.O_inverse == [3, 4, 1, 2, 5, 0]
+
+    assert writhe(G) == writhe(test_link) and crossing_number(G) == crossing_number(test_link)
+
+    assert descending_cusps(G) == descending_cusps(test_link)
+
+    assert convert_to_braid(G) == convert_to_braid(test_link)
+
+    for move in moves:
+        S = stabilisation(G, 2, move)
+        assert isinstance(S, Grid)
+        assert S.X_inverse == [S.X.index(i) for i in range(7)] and S.O_inverse == [S.O.index(i) for i in range(7)]
+
+    assert isinstance(commute_columns(G, 0, 'A'), Grid) and commute_columns(G, 0, 'A') == commute_columns(test_link, 0, 'A')
+
+    assert commute_rows(G, 0, 'A') == 0
+
+    assert isinstance(rotate(G, 1), Grid) and rotate(G, 1) == rotate(test_link, 1)
+
+    with pytest.raises(Exception) as exc_info:
+        Grid(no_grid)
+    assert str(exc_info.value) == 'Invalid Input'
+
+def test_GridState():
+
+    S = GridState(test_link)
+
+    assert S.grid() == test_link and len(S) == 6
+
+    assert S.commute_rows(0) == 0 and S.commute_columns(0) == 1
+
+    assert S.grid() == commute_columns(test_link, 0, 'N')
+
+    assert S.Ainv.tolist() == [S.A.index(i) for i in range(6)]
+
+    for move in moves:
+        assert S.stabilisation(3, move) == 1
+        assert S.grid() == stabilisation(commute_columns(test_link, 0, 'N'), 3, move)
+        assert S.destabilize(3, 'row') == 1 or S.destabilize(4, 'row') == 1
+        assert grid_number(S.grid()) == 6
+        S.undo(2)
+        assert S.grid() == commute_columns(test_link, 0, 'N')
+
+    assert S.cyclic_shift(2, 5) == 1 and S.grid() == cyclic_shift(commute_columns(test_link, 0, 'N'), 2, 5)
+
+    assert S.history == [Move('commutation', 0, 'columns'), Move('shift', 2, 5)]
+
+    assert apply_move(apply_move(test_link, S.history[0]), S.history[1]) == S.grid()
+
+    assert S.apply(Move('stabilisation', 1, 'OSW')) == 1 and len(S) == 7
+
+    S.undo(3)
+
+    assert S.grid() == test_link and S.history == []
+
+    assert GridState([[0, 1], [1, 0]]).destabilize(0) == 0
+
+    assert GridState(disjoint_union(test_grid, [[0, 1], [1, 0]])).destabilize(5) == 0
+
+    with pytest.raises(Exception) as exc_info:
+        S.undo()
+    assert str(exc_info.value) == 'There are not enough moves to undo'
+
+    with pytest.raises(Exception) as exc_info:
+        GridState(no_grid)
+    assert str(exc_info.value) == 'Invalid Input'
+
+######################################################################################################################
+
+
 def test_available_knots():
 
     with pytest.raises(Exception) as exc_info:
@@ -142,6 +221,44 @@ def test_number_of_components():
 
     assert number_of_components(test_link) == 2
 
+    assert number_of_components(generate_torus_link(4,8)) == number_of_components(Grid(generate_torus_link(4,8))) == 4
+
+    assert number_of_components(parallel_copies(test_link, 7)) == 14
+
+def test_identify_knot():
+
+    assert identify_knot(load_knot('5_2')) == '5_2'
+
+    assert identify_knot(cyclic_shift(rotate(load_knot('5_2'), 2), 3, 1)) == '5_2'
+
+    assert identify_knot(mirror_grid(load_knot('7_6'))) == 'm(7_6)'
+
+    assert identify_knot(invert_orientation(load_knot('8_20'))) == '8_20'
+
+    assert identify_knot(mirror_grid(load_knot('4_1'))) == '4_1'
+
+    assert identify_knot(load_legendrian_knot('m(5_2)', random_repr = False)[1]) == 'm(5_2)'
+
+    assert identify_knot(stabilisation(load_knot('3_1'), 2, 'OSE')) == '3_1'
+
+    assert identify_knot(generate_unknot(10)) == 'unknot'
+
+    assert identify_knot(test_link) == 0
+
+    G = [[7, 1, 0, 2, 4, 6, 5, 3], [2, 6, 4, 5, 7, 3, 1, 0]]
+
+    assert identify_knot(G) == 0 and identify_knot(G, radius = 1) == '8_20'
+
+    assert identify_knot(mirror_grid(G), radius = 2) == 'm(8_20)'
+
+    with pytest.raises(Exception) as exc_info:
+        identify_knot(G, radius = -1)
+    assert str(exc_info.value) == 'Invalid radius'
+
+    with pytest.raises(Exception) as exc_info:
+        identify_knot(no_grid)
+    assert str(exc_info.value) == 'Invalid Input'
+
 ######################################################################################################################
 
 
@@ -189,10 +306,104 @@ def test_cyclic_shift():
 ######################################################################################################################
 
 
+def test_canonical_grid():
+
+    G = canonical_grid(test_link)
+
+    assert canonical_grid(cyclic_shift(test_link, 2, 5)) == canonical_grid(rotate(test_link, 2)) == G
+
+    assert G[0][0] == 0 and number_of_components(G) == 2
+
+    assert canonical_grid(mirror_grid(test_grid)) != canonical_grid(test_grid)
+
+    assert canonical_grid(mirror_grid(test_grid), 'dihedral') == canonical_grid(test_grid, 'dihedral')
+
+    assert canonical_grid(Grid(test_link)) == G and isinstance(canonical_grid(Grid(test_link)), Grid)
+
+    with pytest.raises(Exception) as exc_info:
+        canonical_grid(no_grid)
+    assert str(exc_info.value) == 'Invalid Input'
+
+    with pytest.raises(Exception) as exc_info:
+        canonical_grid(test_grid, 'else')
+    assert str(exc_info.value) == 'Invalid symmetry group'
+
+######################################################################################################################
+
+
+def test_grid_hash():
+
+    assert grid_hash(test_link) == grid_hash(cyclic_shift(rotate(test_link, 2), 1, 3))
+
+    assert grid_hash(test_grid) != grid_hash(mirror_grid(test_grid))
+
+    assert grid_hash(test_grid, 'dihedral') == grid_hash(rotate(test_grid, 1), 'dihedral')
+
+######################################################################################################################
+
+
 def test_simplify_grid():
 
     assert sorted(simplify_grid(generate_unknot(10), effort = 'high')) == [[0, 1], [1, 0]]
 
+    G = scramble_grid(test_link, effort = 'low')
+
+    assert check_grid(simplify_grid(G)) == 0 and number_of_components(simplify_grid(G)) == 2
+
+    assert isinstance(simplify_grid(Grid(G), effort = 'low'), Grid)
+
+    H, stats = simplify_grid(G, effort = 'low', restarts = 4, seed = 3, return_stats = True)
+
+    assert len(stats) == 4 and len(H[0]) == min(run['grid_number'] for run in stats)
+
+    assert simplify_grid(G, effort = 'low', restarts = 4, workers = 2, seed = 3) == H
+
+    K = scramble_grid(load_knot('5_2'), effort = 'high')
+
+    for strategy in ['anneal', 'beam']:
+        H = simplify_grid(K, effort = 'low', strategy = strategy, seed = 1)
+        assert check_grid(H) == 0 and grid_number(H) <= grid_number(K)
+        assert simplify_grid(K, effort = 'low', strategy = strategy, seed = 1) == H
+        assert number_of_components(H) == 1
+
+    assert sorted(simplify_grid(generate_unknot(20), strategy = 'anneal', time_limit = 5)) == [[0, 1], [1, 0]]
+
+    H, stats = simplify_grid(K, effort = 10**6, strategy = 'anneal', target_size = 9, seed = 2, return_stats = True)
+
+    assert grid_number(H) <= 9 and stats[0].stopped in ['target', 'size'] and stats[0]['grid_number'] == grid_number(H)
+
+    assert stats[0].sizes[0] == (0, grid_number(K)) and stats[0].sizes[-1][1] == grid_number(H)
+
+    H, stats = simplify_grid(K, effort = 10**6, patience = 20, return_stats = True)
+
+    assert stats[0].stopped in ['patience', 'size'] and stats[0].moves - stats[0].sizes[-1][0] <= 20
+
+    H, stats = simplify_grid(K, effort = 10**9, strategy = 'beam', time_limit = 0.5, return_stats = True)
+
+    assert stats[0].stopped in ['time', 'size', 'exhausted'] and stats[0].time < 5
+
+    assert simplify_grid(K, effort = 50, seed = 4, return_stats = True)[1][0].accepted <= 50
+
+    with pytest.raises(Exception) as exc_info:
+        simplify_grid(G, target_size = 1)
+    assert str(exc_info.value) == 'Invalid target size!'
+
+    with pytest.raises(Exception) as exc_info:
+        simplify_grid(G, patience = 0)
+    assert str(exc_info.value) == 'Invalid patience!'
+
+    with pytest.raises(Exception) as exc_info:
+        simplify_grid(G, strategy = 'greedy')
+    assert str(exc_info.value) == 'Invalid strategy!'
+
+    with pytest.raises(Exception) as exc_info:
+        simplify_grid(G, strategy = 'anneal', time_limit = 0)
+    assert str(exc_info.value) == 'Invalid time limit!'
+
+    with pytest.raises(Exception) as exc_info:
+        simplify_grid(G, restarts = 0)
+    assert str(exc_info.value) == 'Invalid number of restarts or workers!'
+
     with pytest.raises(Exception) as exc_info:
         simplify_grid(no_grid, 'high')
     assert str(exc_info.value) == 'Invalid Input'
@@ -246,6 +457,29 @@ def test_stabilisation():
 ######################################################################################################################
 
 
+def test_destabilization_sites():
+
+    G = [[6, 5, 0, 1, 4, 2, 3], [5, 1, 2, 4, 3, 6, 0]]
+
+    assert destabilization_sites(G) == [[0, 4], [4, 5]]
+
+    rows, columns = destabilization_sites(G)
+    for where in range(7):
+        assert (destabilize(G, where, selection = 'row') != 0) == (where in rows)
+        assert (destabilize(G, where, selection = 'col') != 0) == (where in columns)
+
+    assert destabilization_sites(test_grid) == [[], []]
+
+    assert destabilization_sites([[0, 1], [1, 0]]) == [[], []]
+
+    with pytest.raises(Exception) as exc_info:
+        destabilization_sites(no_grid)
+    assert str(exc_info.value) == 'Invalid Input grid'
+
+
+######################################################################################################################
+
+
 def test_destabilize():
 
     with pytest.raises(Exception) as exc_info:
@@ -277,6 +511,15 @@ def test_destabilize_all():
     for move in moves:
         for pos in range(0,len(test_grid[0])):
             assert destabilize_all(stabilisation(test_grid, pos, move)) == test_grid
+
+    assert destabilize_all(generate_unknot(2000)) == [[0, 1], [1, 0]]
+
+    G, performed = destabilize_all(Grid(stabilisation(stabilisation(test_grid, 1, 'ONW'), 4, 'XSE')), return_moves = True)
+
+    assert isinstance(G, Grid) and G == test_grid and len(performed) == 2 and performed[0].kind == 'destabilization'
+
+    # the 2x2 component is left alone, but the other one is still destabilized
+    assert destabilize_all(disjoint_union([[0,1],[1,0]], stabilisation(test_grid, 0, 'XNE'))) == [[0, 1, 2, 3, 4, 5, 6], [1, 0, 4, 5, 6, 2, 3]]
             
 ######################################################################################################################
 
@@ -296,6 +539,8 @@ def test_grid_length():
 
     assert grid_length(test_grid) == 24 
 
+    assert grid_length(Grid(test_grid)) == grid_length(rotate(test_grid, 1)) == 24
+
 ######################################################################################################################
 
 
@@ -307,6 +552,10 @@ def test_convert_to_braid():
 
     assert convert_to_braid(test_grid, optimized = 'S') == [-1,-1,-1]
 
+    braid = convert_to_braid(parallel_copies(test_grid, 4), optimized = 'N')
+
+    assert len(braid) == 100 and sum(1 if g > 0 else -1 for g in braid) == -52 and max(abs(g) for g in braid) == 11
+
     with pytest.raises(Exception) as exc_info:
         assert convert_to_braid(no_grid)
     assert str(exc_info.value) == 'Invalid Input'
@@ -318,10 +567,37 @@ def test_convert_to_braid():
 ######################################################################################################################
 
 
+def test_reduce_braid():
+
+    assert reduce_braid([1, 2, -1, 2, -3, 2, 1]) == [2, 1, 1, 2, -1, 2]
+
+    assert reduce_braid([1, 2, 3]) == reduce_braid([]) == [1]
+
+    assert reduce_braid([1, 2, -2, 1]) == [1, 1, 2, -2]
+
+    assert reduce_braid([3, 1, -3, 2, 2, 1]) == [1, 2, 2, 1, 3, -3]
+
+    assert convert_to_braid(test_grid, optimized = 'N', reduce = True) == [-1, -2, -1, -2]
+
+    G = parallel_copies(test_grid, 4)
+
+    assert len(convert_to_braid(G, reduce = True)) < len(convert_to_braid(G))
+
+    with pytest.raises(Exception) as exc_info:
+        reduce_braid([1, 0, 2])
+    assert str(exc_info.value) == 'Invalid braid word'
+
+######################################################################################################################
+
+
 def test_crossing_number():
 
     assert crossing_number(test_grid) == 3
 
+    assert crossing_number(parallel_copies(generate_torus_link(3,2),11)) == 363
+
+    assert crossing_number(test_link) == crossing_number(Grid(test_link)) == 1
+
 ######################################################################################################################
 
 
@@ -350,6 +626,10 @@ def test_writhe():
 
     assert writhe(mirror_grid(test_grid)) == 3
 
+    assert writhe(parallel_copies(generate_torus_link(3,2),11)) == 363
+
+    assert writhe(generate_torus_link(2,15)) == 15
+
     with pytest.raises(Exception) as exc_info:
         assert writhe(no_grid)
     assert str(exc_info.value) == 'Invalid Input'
@@ -417,9 +697,15 @@ def test_Gauss_code():
         Gauss_code(no_grid)
     assert str(exc_info.value) == 'Invalid grid Input!'
 
-    with pytest.raises(Exception) as exc_info:
-        Gauss_code(test_link)
-    assert str(exc_info.value) == 'Right now the Gauss code is only implemented for knots!'
+    assert Gauss_code(test_link) == [[[1, -1]], [-1]]
+
+    assert Gauss_code(generate_torus_link(2,4)) == [[[-1, 2, -3, 4], [-4, 1, -2, 3]], [1, 1, 1, 1]]
+
+    assert Gauss_code(generate_unlink(3)) == [[], []]
+
+    G = parallel_copies(test_grid, 20)
+
+    assert len(Gauss_code(G)[1]) == crossing_number(G) and sum(Gauss_code(G)[1]) == writhe(G)
 
 ######################################################################################################################
 
@@ -432,10 +718,66 @@ def test_generate_random_grid():
 
             assert number_of_components(generate_random_grid(i,j)) == j
 
+    G = generate_random_grid(300, 150)
+
+    assert check_grid(G) == 0 and number_of_components(G) == 150
+
+    assert number_of_components(generate_random_grid(300, 1)) == 1
+
     with pytest.raises(Exception) as exc_info:
         generate_random_grid(4,5)
     assert str(exc_info.value) == 'Wrong number of components or incorrect grid size!'
 
+    with pytest.raises(Exception) as exc_info:
+        generate_random_grid(7,4)
+    assert str(exc_info.value) == 'Wrong number of components or incorrect grid size!'
+
+######################################################################################################################
+
+
+def test_iter_random_grids():
+
+    assert list(iter_random_grids(5, count = 2, seed = 7)) == [[[0, 3, 1, 2, 4], [4, 1, 3, 0, 2]], [[1, 3, 4, 0, 2], [2, 1, 0, 3, 4]]]
+
+    grids = list(iter_random_grids(20, count = 10, seed = 3, components = 4, stream = 2))
+
+    assert len(grids) == 10 and all(check_grid(G) == 0 and number_of_components(G) == 4 for G in grids)
+
+    assert grids == list(iter_random_grids(20, count = 10, seed = 3, components = 4, stream = 2))
+
+    assert grids != list(iter_random_grids(20, count = 10, seed = 3, components = 4, stream = 3))
+
+    with pytest.raises(Exception) as exc_info:
+        next(iter_random_grids(6, components = 4))
+    assert str(exc_info.value) == 'Wrong number of components or incorrect grid size!'
+
+######################################################################################################################
+
+
+def test_fill_random_grids():
+
+    import numpy as np
+
+    out = np.zeros((4, 2, 20), dtype = np.int32)
+
+    source = iter_random_grids(20, count = 10, seed = 3, components = 4, stream = 2)
+
+    assert fill_random_grids(out, source) == 4 and out.tolist() == list(iter_random_grids(20, count = 4, seed = 3, components = 4, stream = 2))
+
+    assert fill_random_grids(out, source) == 4 and fill_random_grids(out, source) == 2
+
+    grids = list(iter_random_grids(20, count = 5, seed = 3))
+
+    source = iter_random_grids(20, count = 5, seed = 3)
+
+    assert next(source) == grids[0] and fill_random_grids(out, source) == 4 and out.tolist() == grids[1:]
+
+    assert fill_random_grids(out, iter(grids)) == 4 and out.tolist() == grids[:4]
+
+    with pytest.raises(Exception) as exc_info:
+        fill_random_grids(np.zeros((4, 20)), source)
+    assert str(exc_info.value) == 'Invalid output array'
+
 ######################################################################################################################
 
 
@@ -486,6 +828,108 @@ def test_perform_all_moves():
         perform_all_moves(no_grid)
     assert str(exc_info.value) == 'Invalid Input'
 
+def test_iter_grids():
+
+    assert list(iter_grids(2)) == [[[0, 1], [1, 0]]]
+
+    assert [len(list(iter_grids(5, symmetries))) for symmetries in ['translations', 'isotopy', 'dihedral']] == [224, 60, 40]
+
+    grids = list(iter_grids(5, 'isotopy'))
+
+    assert all(canonical_grid(G, 'isotopy') == G for G in grids)
+
+    assert len(set(grid_hash(G, 'isotopy') for G in grids)) == 60
+
+    assert sorted(G for part in range(3) for G in iter_grids(5, 'isotopy', part, 3)) == sorted(grids)
+
+    with pytest.raises(Exception) as exc_info:
+        next(iter_grids(5, part = 2, parts = 2))
+    assert str(exc_info.value) == 'Invalid part'
+
+    with pytest.raises(Exception) as exc_info:
+        next(iter_grids(5, 'rotations'))
+    assert str(exc_info.value) == 'Invalid symmetry group'
+
+######################################################################################################################
+
+
+def test_enumerate_grids(tmp_path):
+
+    path = str(tmp_path / 'grids.jsonl')
+
+    assert enumerate_grids(4, path) == 8
+
+    records = [json.loads(line) for line in open(path)]
+
+    assert [record['grid'] for record in records] == list(iter_grids(4))
+
+    assert records[0] == {'grid': [[0, 1, 2, 3], [1, 2, 3, 0]], 'components': 1, 'writhe': 0, 'tb': -3, 'destabilizable': True}
+
+    assert sum(record['components'] == 2 for record in records) == 4
+
+    assert enumerate_grids(4, path, part = 1, parts = 2) < 8
+
+    assert [record['destabilizable'] for record in records] == [len(destabilize_all(G)[0]) < 4 for G in iter_grids(4)]
+
+    assert enumerate_grids(5, path) == 40
+
+    records = [json.loads(line) for line in open(path)]
+
+    assert [record['destabilizable'] for record in records] == [len(destabilize_all(G)[0]) < 5 for G in iter_grids(5)]
+
+    path = str(tmp_path / 'grids.grids')
+
+    assert enumerate_grids(5, path, output_format = 'corpus') == 40
+
+    with GridCorpusReader(path) as corpus:
+        assert list(corpus) == list(iter_grids(5))
+
+    with pytest.raises(Exception) as exc_info:
+        enumerate_grids(4, path, output_format = 'csv')
+    assert str(exc_info.value) == 'Invalid output format'
+
+######################################################################################################################
+
+
+def test_iter_moves():
+
+    assert [apply_move(test_link, move) for move in iter_moves(test_link, unique = True)] == perform_all_moves(test_link)
+
+    assert [G for move, G in iter_moves(test_link, unique = True, grids = True)] == perform_all_moves(test_link)
+
+    assert 0 not in [apply_move(test_link, move) for move in iter_moves(test_link)]
+
+    assert len(list(iter_moves([[0,1],[1,0]]))) == 16
+
+    assert len(list(iter_moves(test_grid, unique = False))) == 8*5
+
+    assert next(iter_moves(test_grid)) == Move('stabilisation', 0, 'XNE')
+
+    S = GridState(test_link)
+
+    records = [apply_move(S, move, in_place = True) for move in [Move('stabilisation', 2, 'OSW'), Move('commutation', 4, 'columns')]]
+
+    assert S.grid() == commute_columns(stabilisation(test_link, 2, 'OSW'), 4, 'N')
+
+    with pytest.raises(Exception) as exc_info:
+        undo_move(S, records[0])
+    assert str(exc_info.value) == 'Records must be undone in reverse order'
+
+    for record in reversed(records):
+        undo_move(S, record)
+
+    assert S.grid() == test_link
+
+    assert apply_move(S, Move('commutation', 1, 'rows'), in_place = True) == 0
+
+    with pytest.raises(Exception) as exc_info:
+        apply_move([list(test_link[0]), list(test_link[1])], Move('commutation', 0, 'rows'), in_place = True)
+    assert str(exc_info.value) == 'In-place moves need a GridState'
+
+    with pytest.raises(Exception) as exc_info:
+        next(iter_moves(no_grid))
+    assert str(exc_info.value) == 'Invalid Input'
+
 ######################################################################################################################
 
 
@@ -501,6 +945,14 @@ def test_rotate():
 
     assert rotate(random_grid, 4) == random_grid
 
+    G = Grid(random_grid)
+
+    assert rotate(rotate(G, 3), 2) == rotate(random_grid, 1) == mirror_grid(G)
+
+    assert rotate(rotate(rotate(G, 1), 1), 2) == random_grid
+
+    assert rotate(G, 2).X_inverse == [rotate(random_grid, 2)[0].index(i) for i in range(100)]
+
 ######################################################################################################################
 
 
@@ -511,6 +963,25 @@ def test_rotate_once():
 ######################################################################################################################
 
 
+def test_commutation_sites():
+
+    assert commutation_sites(test_link) == ['BYBYB', 'NNNNY']
+
+    assert commutation_sites(test_grid) == ['YYYY', 'YYYY']
+
+    rows, columns = commutation_sites(test_link)
+    for where in range(len(rows)):
+        assert (commute_rows(test_link, where, 'N') != 0) == (rows[where] == 'N')
+        assert (commute_columns(test_link, where, 'N') != 0) == (columns[where] == 'N')
+
+    with pytest.raises(Exception) as exc_info:
+        commutation_sites(no_grid)
+    assert str(exc_info.value) == 'Invalid Input grid'
+
+
+######################################################################################################################
+
+
 def test_commute_columns():
 
    assert commute_columns(test_link, 0, 'A') == [[2, 4, 1, 3, 5, 0], [5, 2, 3, 1, 0, 4]]
@@ -602,5 +1073,128 @@ def test_draw_grid():
 
 
 
-    
+######################################################################################################################
+
+
+def test_batch_invariants():
+
+    grids = [generate_random_grid(9) for i in range(40)]
+
+    invariants = batch_invariants(grids)
+
+    assert list(invariants['writhe']) == [writhe(G) for G in grids]
+
+    assert list(invariants['thurston_bennequin']) == [thurston_bennequin(G) for G in grids]
+
+    assert list(invariants['rotation_number']) == [rotation_number(G) for G in grids]
+
+    assert list(invariants['descending_cusps']) == [descending_cusps(G) for G in grids]
+
+    assert list(invariants['ascending_cusps']) == [ascending_cusps(G) for G in grids]
+
+    assert list(invariants['number_of_components']) == [number_of_components(G) for G in grids]
+
+    links = [test_link, invert_orientation(test_link), mirror_grid(test_link), generate_unlink(3)]
+
+    assert list(batch_writhe(links)) == [writhe(G) for G in links]
+
+    assert list(batch_thurston_bennequin(links)) == [thurston_bennequin(G) for G in links]
+
+    assert list(batch_rotation_number(links)) == [rotation_number(G) for G in links]
+
+    assert list(batch_descending_cusps(links)) == [descending_cusps(G) for G in links]
+
+    assert list(batch_ascending_cusps(links)) == [ascending_cusps(G) for G in links]
+
+    assert list(batch_number_of_components(links)) == [2, 2, 2, 3]
+
+    with pytest.raises(Exception) as exc_info:
+        batch_writhe([test_grid, no_grid])
+    assert str(exc_info.value) == 'Invalid Input'
+
+    with pytest.raises(Exception) as exc_info:
+        batch_writhe([test_grid, test_link])
+    assert str(exc_info.value) == 'Invalid Input'
+
+def test_corpus(tmp_path):
+
+    path = str(tmp_path / 'knots.grids')
+
+    names = ['3_1', '5_2', '8_5', '8_21']
+
+    with GridCorpusWriter(path, max_grid_number = 11) as writer:
+        for name in names:
+            writer.write(load_knot(name))
+        assert len(writer) == 4
+
+    with GridCorpusReader(path) as corpus:
+        assert len(corpus) == 4 and corpus.width == 1
+        assert list(corpus) == [load_knot(name) for name in names]
+        assert corpus[-2] == load_knot('8_5') and corpus.grid_number(1) == 7
+        A, B = corpus.arrays(2)
+        assert A.tolist() == load_knot('8_5')[0] and B.tolist() == load_knot('8_5')[1]
+        del A, B
+
+    grids = [generate_unknot(300), generate_torus_link(2, 3)]
+
+    assert write_corpus(path, grids) == 2
+
+    with GridCorpusReader(path) as corpus:
+        assert corpus.width == 2 and list(corpus) == grids
+
+    assert write_corpus(path, iter_random_grids(12, count = 50), max_grid_number = 12) == 50
+
+    corpus = GridCorpusReader(path)
+
+    assert corpus.as_array().shape == (50, 2, 12)
+
+    assert corpus.as_array()[7].tolist() == list(iter_random_grids(12, count = 8))[7]
+
+    with pytest.raises(IndexError):
+        corpus[50]
+
+    with pytest.raises(Exception) as exc_info:
+        GridCorpusWriter(path, max_grid_number = 2**40)
+    assert str(exc_info.value) == 'Invalid maximal grid number'
+
+    markings = corpus.as_array()
+
+    with pytest.raises(Exception) as exc_info:
+        corpus.close()
+    assert str(exc_info.value) == 'The arrays of the corpus must be deleted before closing it'
+
+    assert corpus[3] == markings[3].tolist()
+
+    del markings
+
+    corpus.close()
+
+    with pytest.raises(Exception) as exc_info:
+        GridCorpusWriter(path, max_grid_number = 5).write(load_knot('5_2'))
+    assert str(exc_info.value) == 'The grid is larger than the maximal grid number of the corpus'
+
+    with open(path, 'wb') as f:
+        f.write(b'[[0, 1], [1, 0]]')
+
+    with pytest.raises(Exception) as exc_info:
+        GridCorpusReader(path)
+    assert str(exc_info.value) == 'Invalid corpus file'
+
+######################################################################################################################
+
+
+def test_import():
+
+    # the heavy dependencies are only imported by the functions which need them
+    script = "import sys, GridPythonModule; print(sorted(m for m in ['matplotlib', 'sympy', 'numpy'] if m in sys.modules))"
+
+    assert subprocess.run([sys.executable, '-c', script], capture_output = True, text = True).stdout.strip() == '[]'
+
+    # the star import only exports the functions of the module
+    namespace = {}
+
+    exec('from GridPythonModule import *', namespace)
+
+    assert not {'array', 'exp', 'struct', 'sys', 'shuffle', 'Random', 'namedtuple', 'perf_counter', 'insort', 'heappush'} & set(namespace)
 
+    assert set(GridPythonModule.GridPyM.__all__) <= set(namespace)
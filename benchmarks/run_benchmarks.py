@@ -0,0 +1,208 @@
+#########################################################################
+#    Benchmarks for GridPythonModule.
+#
+#    Times the public functions of the module on several families of grids
+#    (torus links, twist knots, random grids and cables of the trefoil) of
+#    increasing size. Random choices are made with fixed seeds, so that two
+#    runs perform exactly the same moves. The results are written as JSON,
+#    and can be compared with a stored baseline to detect regressions: the minimum
+#    over several repeats is compared, and the fastest benchmarks are skipped, since
+#    their timings are dominated by noise.
+#
+#    The time needed to import the module in a fresh interpreter is measured as well,
+#    since process pools and command line tools pay it for every process.
+#
+#    Usage:
+#        python benchmarks/run_benchmarks.py --output results.json
+#        python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+#        python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+#########################################################################
+
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+from time import perf_counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import GridPythonModule
+from GridPythonModule import *
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def torus_family(size, seed):
+    #a torus link with grid number equal to size
+    return generate_torus_link(size//2, size - size//2)
+
+def twist_family(size, seed):
+    #generate_twist_knot(k) has grid number k+4
+    return generate_twist_knot(max(size - 4, 1))
+
+def random_family(size, seed):
+    random.seed(seed)
+    return generate_random_grid(size)
+
+def cable_family(size, seed):
+    #parallel copies of a grid of size 5 for the trefoil
+    return parallel_copies(load_knot('3_1'), max(size//5, 1))
+
+FAMILIES = {'torus': torus_family,
+            'twist': twist_family,
+            'random': random_family,
+            'cable': cable_family}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+#each benchmark is a function of the grid, called after seeding the global random
+#generator. The grids are built before the timing starts
+BENCHMARKS = {
+    'simplify_grid': lambda G: simplify_grid(G, effort = 'low'),
+    'simplify_grid_anneal': lambda G: simplify_grid(G, effort = 'low', strategy = 'anneal'),
+    'simplify_grid_beam': lambda G: simplify_grid(G, effort = 'low', strategy = 'beam'),
+    'scramble_grid': lambda G: scramble_grid(G, effort = 'low'),
+    'convert_to_braid': lambda G: convert_to_braid(G),
+    'Gauss_code': lambda G: Gauss_code(G),
+    'writhe': lambda G: writhe(G),
+    'crossing_number': lambda G: crossing_number(G),
+    'thurston_bennequin': lambda G: thurston_bennequin(G),
+    'rotation_number': lambda G: rotation_number(G),
+    'number_of_components': lambda G: number_of_components(G),
+    'perform_all_moves': lambda G: perform_all_moves(G),
+    'destabilization_sites': lambda G: destabilization_sites(G),
+    'destabilize_all': lambda G: destabilize_all(G),
+    'parallel_copies': lambda G: parallel_copies(G, 2),
+    'generate_random_grid': lambda G: generate_random_grid(len(G[0])),
+    'commutation_sites': lambda G: commutation_sites(G),
+    'canonical_grid': lambda G: canonical_grid(G),
+    'grid_hash': lambda G: grid_hash(G),
+    'identify_knot': lambda G: identify_knot(G, radius = 1),
+    'batch_invariants': lambda G: batch_invariants([G]*100),
+    'rotate': lambda G: rotate(G, 1),
+    'cyclic_shift': lambda G: cyclic_shift(G, 1, 1),
+}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def time_benchmark(function, grid, seed, repeat):
+    #minimum and median time over "repeat" calls, each after seeding the random generator
+    times = []
+    for i in range(repeat):
+        random.seed(seed)
+        start = perf_counter()
+        function(grid)
+        times.append(perf_counter() - start)
+    times.sort()
+    return {'min': times[0], 'median': times[len(times)//2], 'repeat': repeat}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def time_import(repeat):
+    #time needed by a fresh interpreter to run "import GridPythonModule", measured
+    #inside the interpreter so that its own startup is not included
+    script = ('import time; start = time.perf_counter(); import GridPythonModule; '
+              'print(time.perf_counter() - start)')
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    times = []
+    for i in range(repeat):
+        output = subprocess.run([sys.executable, '-c', script], cwd = root,
+                                capture_output = True, text = True, check = True).stdout
+        times.append(float(output))
+    times.sort()
+    return {'min': times[0], 'median': times[len(times)//2], 'repeat': repeat}
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def run_benchmarks(names, families, sizes, seed, repeat, verbose = True):
+    #runs all the selected benchmarks, returning a dictionary keyed by
+    #"benchmark/family/size". Benchmarks raising an exception on some grid are
+    #recorded with the error message instead of the timings
+    results = {'import/GridPythonModule': time_import(max(repeat, 5))}
+    if verbose:
+        print('%-45s %10.6f s' %('import/GridPythonModule', results['import/GridPythonModule']['min']))
+    for family in families:
+        for size in sizes:
+            grid = FAMILIES[family](size, seed)
+            for name in names:
+                key = '%s/%s/%d' %(name, family, size)
+                try:
+                    results[key] = time_benchmark(BENCHMARKS[name], grid, seed, repeat)
+                    results[key]['grid_number'] = len(grid[0])
+                except Exception as error:
+                    results[key] = {'error': str(error)}
+                if verbose:
+                    if 'error' in results[key]:
+                        print('%-45s error: %s' %(key, results[key]['error']))
+                    else:
+                        print('%-45s %10.6f s' %(key, results[key]['min']))
+    return results
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def compare_with_baseline(results, baseline, threshold, min_time = 0.001):
+    #the benchmarks whose minimum time over the repeats grew by more than the given 
+    #fraction. Benchmarks faster than min_time in the baseline are skipped, since a
+    #few microseconds of noise would be reported as a large relative slowdown
+    regressions = []
+    for key, result in sorted(results.items()):
+        old = baseline.get(key)
+        if old is None or 'min' not in old or 'min' not in result:
+            continue
+        if old['min'] < min_time and result['min'] < min_time:
+            continue
+        if result['min'] > max(old['min'], min_time)*(1 + threshold):
+            regressions.append((key, old['min'], result['min']))
+    return regressions
+
+#+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++
+
+def main(arguments = None):
+    parser = argparse.ArgumentParser(description = 'Benchmarks for GridPythonModule.')
+    parser.add_argument('--benchmarks', nargs = '+', default = sorted(BENCHMARKS),
+                        choices = sorted(BENCHMARKS), metavar = 'NAME',
+                        help = 'benchmarks to run (default: all)')
+    parser.add_argument('--families', nargs = '+', default = sorted(FAMILIES),
+                        choices = sorted(FAMILIES), help = 'families of grids (default: all)')
+    parser.add_argument('--sizes', nargs = '+', type = int, default = [10, 20, 40],
+                        help = 'grid numbers (default: 10 20 40)')
+    parser.add_argument('--seed', type = int, default = 0, help = 'random seed (default: 0)')
+    parser.add_argument('--repeat', type = int, default = 3, help = 'timings per benchmark (default: 3)')
+    parser.add_argument('--output', help = 'write the results to this JSON file')
+    parser.add_argument('--baseline', help = 'compare with the results stored in this JSON file')
+    parser.add_argument('--threshold', type = float, default = 0.25,
+                        help = 'relative slowdown reported as a regression (default: 0.25)')
+    parser.add_argument('--min-time', type = float, default = 0.001,
+                        help = 'benchmarks faster than this many seconds are not compared (default: 0.001)')
+    parser.add_argument('--save-baseline', help = 'store the results as a new baseline in this JSON file')
+    parser.add_argument('--quiet', action = 'store_true', help = 'do not print the timings')
+    args = parser.parse_args(arguments)
+
+    results = run_benchmarks(args.benchmarks, args.families, args.sizes, args.seed,
+                             args.repeat, verbose = not args.quiet)
+    report = {'meta': {'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'module': os.path.dirname(GridPythonModule.__file__),
+                       'sizes': args.sizes,
+                       'seed': args.seed,
+                       'repeat': args.repeat},
+              'results': results}
+    for path in [args.output, args.save_baseline]:
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent = 1, sort_keys = True)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare_with_baseline(results, baseline, args.threshold, args.min_time)
+        for key, old, new in regressions:
+            print('REGRESSION %-45s %10.6f s -> %10.6f s' %(key, old, new))
+        if regressions:
+            return 1
+        print('No regressions with respect to %s' %args.baseline)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -9,9 +9,9 @@ setup(
     author_email='dceloria.maths@gmail.com',
     license='GNU general public',
     packages=['GridPythonModule'],
-    install_requires=['simpy',
-                      'random2',
-                      'matplotlib'
+    install_requires=['random2',
+                      'matplotlib',
+                      'numpy'
                       ],
 
     classifiers=[